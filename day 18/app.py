@@ -3,16 +3,18 @@ from fastapi import FastAPI, Request, UploadFile, File, Path, WebSocket, WebSock
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from typing import Dict, List, Any, Type
+from typing import Type
 import logging
 from pathlib import Path as PathLib
 from uuid import uuid4
 import json
-import asyncio
 
 # Import the config file FIRST to load dotenv and configure APIs
 import config
 from services import stt, llm, tts
+from services.message_pump import MessagePump
+from services.recorder import SessionRecorder
+from services.session_store import SessionStore
 from schemas import TTSRequest
 
 # AssemblyAI streaming imports
@@ -37,14 +39,40 @@ app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# In-memory store for chat histories.
-chat_histories: Dict[str, List[Dict[str, Any]]] = {}
+# Bounded store for chat histories (LRU + idle TTL, optional SQLite persistence).
+chat_histories = SessionStore(
+    max_sessions=config.SESSION_MAX_ENTRIES,
+    max_bytes=config.SESSION_MAX_BYTES,
+    ttl_seconds=config.SESSION_TTL_SECONDS,
+    db_path=config.SESSION_DB_PATH,
+)
 
 # Base directory and uploads folder
 BASE_DIR = PathLib(__file__).resolve().parent
 UPLOADS_DIR = BASE_DIR / "uploads"
 UPLOADS_DIR.mkdir(exist_ok=True)
 
+# Sampled, size-capped debug recordings of /ws audio, written off the event loop
+recorder = SessionRecorder(
+    UPLOADS_DIR,
+    sample_percent=config.RECORDING_SAMPLE_PERCENT,
+    max_file_bytes=config.RECORDING_MAX_FILE_BYTES,
+    max_total_bytes=config.RECORDING_MAX_TOTAL_BYTES,
+    retention_seconds=config.RECORDING_RETENTION_SECONDS,
+)
+
+
+@app.on_event("shutdown")
+def close_session_store():
+    """Flushes pending chat history writes before the server exits."""
+    chat_histories.close()
+
+
+@app.on_event("shutdown")
+def close_recorder():
+    """Flushes and closes any recordings still open."""
+    recorder.close()
+
 
 @app.get("/")
 async def home(request: Request):
@@ -122,7 +150,9 @@ async def websocket_audio_streaming(websocket: WebSocket):
     """Receive PCM audio chunks from client and transcribe in real-time using AssemblyAI with turn detection."""
     await websocket.accept()
     file_id = uuid4().hex
-    file_path = UPLOADS_DIR / f"streamed_{file_id}.pcm"
+    # ?record=1 / ?record=0 switches recording on or off for this session; otherwise it is sampled
+    record_param = websocket.query_params.get("record")
+    recording = recorder.open(file_id, None if record_param is None else record_param == "1")
 
     # Check if AssemblyAI API key is configured
     if not config.ASSEMBLYAI_API_KEY:
@@ -134,8 +164,8 @@ async def websocket_audio_streaming(websocket: WebSocket):
         await websocket.close(code=1000, reason="AssemblyAI API key not configured")
         return
 
-    # Create a queue for transcription messages
-    transcription_queue = asyncio.Queue()
+    # Outbound messages to the client; safe to use from AssemblyAI's callback thread
+    outbox = MessagePump(websocket)
 
     # Initialize AssemblyAI StreamingClient
     client = StreamingClient(
@@ -160,21 +190,18 @@ async def websocket_audio_streaming(websocket: WebSocket):
             print(f"END OF TURN - FINAL TRANSCRIPTION: {transcript_text}")
             
             # Put final transcription in queue for async sending
-            try:
-                transcription_queue.put_nowait({
-                    "type": "transcription",
-                    "text": transcript_text,
-                    "is_final": True,
-                    "end_of_turn": True
-                })
-                
-                # Send explicit end-of-turn notification
-                transcription_queue.put_nowait({
-                    "type": "turn_end",
-                    "message": "User stopped talking"
-                })
-            except asyncio.QueueFull:
-                logging.warning("Transcription queue is full")
+            outbox.send({
+                "type": "transcription",
+                "text": transcript_text,
+                "is_final": True,
+                "end_of_turn": True
+            })
+
+            # Send explicit end-of-turn notification
+            outbox.send({
+                "type": "turn_end",
+                "message": "User stopped talking"
+            })
         
         # Configure turn formatting if not already done
         if event.end_of_turn and not event.turn_is_formatted:
@@ -190,13 +217,10 @@ async def websocket_audio_streaming(websocket: WebSocket):
 
     def on_error(self: Type[StreamingClient], error: StreamingError):
         logging.error(f"AssemblyAI streaming error: {error}")
-        try:
-            transcription_queue.put_nowait({
-                "type": "error",
-                "message": f"Transcription error: {error}"
-            })
-        except asyncio.QueueFull:
-            logging.warning("Transcription queue is full")
+        outbox.send({
+            "type": "error",
+            "message": f"Transcription error: {error}"
+        })
 
     # Register event handlers
     client.on(StreamingEvents.Begin, on_begin)
@@ -204,21 +228,8 @@ async def websocket_audio_streaming(websocket: WebSocket):
     client.on(StreamingEvents.Termination, on_terminated)
     client.on(StreamingEvents.Error, on_error)
 
-    # Task to send transcription messages to client
-    async def send_transcriptions():
-        while True:
-            try:
-                message = await asyncio.wait_for(transcription_queue.get(), timeout=0.1)
-                await websocket.send_text(json.dumps(message))
-                transcription_queue.task_done()
-            except asyncio.TimeoutError:
-                continue
-            except Exception as e:
-                logging.error(f"Error sending transcription: {e}")
-                break
-
-    # Start the transcription sender task
-    sender_task = asyncio.create_task(send_transcriptions())
+    # Start the outbound message pump
+    outbox.start()
 
     # Connect to AssemblyAI streaming service
     try:
@@ -236,28 +247,30 @@ async def websocket_audio_streaming(websocket: WebSocket):
             "message": "Connected to transcription service with turn detection"
         }))
 
-        # Save audio to file for debugging (optional)
-        with open(file_path, "wb") as f:
-            while True:
-                message = await websocket.receive()
-                
-                if "bytes" in message:
-                    pcm_data = message["bytes"]
-                    logging.debug(f"Received audio chunk of size: {len(pcm_data)} bytes")
-                    f.write(pcm_data)  # Save to file for debugging
-                    client.stream(pcm_data)  # Send to AssemblyAI for transcription
-                    
-                elif message.get("text") == "EOF":
-                    logging.info("Recording finished. Closing transcription session.")
-                    break
+        while True:
+            message = await websocket.receive()
+
+            if "bytes" in message:
+                pcm_data = message["bytes"]
+                logging.debug(f"Received audio chunk of size: {len(pcm_data)} bytes")
+                if recording:
+                    recording.write(pcm_data)  # Queued for the recorder thread
+                client.stream(pcm_data)  # Send to AssemblyAI for transcription
+
+            elif message.get("text") == "EOF":
+                logging.info("Recording finished. Closing transcription session.")
+                break
 
     except WebSocketDisconnect:
         logging.info("Client disconnected from WebSocket")
     except Exception as e:
         logging.error(f"WebSocket error: {str(e)}")
     finally:
-        # Cancel the sender task
-        sender_task.cancel()
+        if recording:
+            recording.close()
+
+        # Flush pending messages and stop the pump
+        await outbox.close()
         
         # Clean up AssemblyAI connection
         try:
@@ -0,0 +1,103 @@
+# services/message_pump.py
+import asyncio
+import json
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_CLOSE = object()
+
+
+class MessagePump:
+    """
+    Outbound JSON messages for one WebSocket, sent by a single task that only
+    wakes when something is queued (no polling).
+      - send() is safe to call from any thread (AssemblyAI callbacks included)
+      - when several messages are waiting, those under `small_message_bytes` go
+        out together as one {"type": "batch", "messages": [...]} frame of at
+        most `max_batch` messages
+      - close() lets the queue drain for up to `close_timeout` seconds, then cancels the pump
+    """
+
+    def __init__(self, websocket, max_batch: int = 32, small_message_bytes: int = 1024, close_timeout: float = 1.0):
+        self.websocket = websocket
+        self.max_batch = max_batch
+        self.small_message_bytes = small_message_bytes
+        self.close_timeout = close_timeout
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._task = self._loop.create_task(self._run())
+
+    def send(self, message: Dict[str, Any]):
+        """Queues a message; never blocks."""
+        if self._loop is None:
+            raise RuntimeError("MessagePump.send() called before start()")
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._queue.put_nowait(message)
+        else:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, message)
+
+    async def close(self):
+        """Sends what is already queued, then stops the pump."""
+        task, self._task = self._task, None
+        if task is None:
+            return
+        self._queue.put_nowait(_CLOSE)
+        done, _ = await asyncio.wait({task}, timeout=self.close_timeout)
+        if not done:
+            # Most likely stuck in send_text on a dead socket: stop it instead of leaving it behind
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        try:
+            await self._pump()
+        except Exception as e:
+            # Client went away; nothing left to deliver to
+            logger.debug(f"Message pump stopped: {e}")
+
+    async def _pump(self):
+        while True:
+            message = await self._queue.get()
+            if message is _CLOSE:
+                return
+            encoded = json.dumps(message)
+            if self._queue.empty() or len(encoded) >= self.small_message_bytes:
+                await self.websocket.send_text(encoded)
+                continue
+
+            # More is waiting: gather the small messages behind this one into one frame
+            batch: List[str] = [encoded]
+            pending_large: Optional[str] = None
+            closing = False
+            while len(batch) < self.max_batch and not self._queue.empty():
+                nxt = self._queue.get_nowait()
+                if nxt is _CLOSE:
+                    closing = True
+                    break
+                nxt_encoded = json.dumps(nxt)
+                if len(nxt_encoded) >= self.small_message_bytes:
+                    pending_large = nxt_encoded
+                    break
+                batch.append(nxt_encoded)
+
+            if len(batch) == 1:
+                await self.websocket.send_text(batch[0])
+            else:
+                await self.websocket.send_text('{"type": "batch", "messages": [' + ", ".join(batch) + "]}")
+            if pending_large is not None:
+                await self.websocket.send_text(pending_large)
+            if closing:
+                return
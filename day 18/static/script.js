@@ -94,40 +94,44 @@ document.addEventListener("DOMContentLoaded", async () => {
             socket.onmessage = (event) => {
                 console.log("Received WebSocket message:", event.data);
                 try {
-                    const data = JSON.parse(event.data);
-                    console.log("Parsed message data:", data);
-                    
-                    if (data.type === "transcription" && data.end_of_turn) {
-                        // Display transcription only at end of turn
-                        console.log(`End of turn transcription: ${data.text}`);
+                    const payload = JSON.parse(event.data);
+                    console.log("Parsed message data:", payload);
+
+                    // The server batches small messages when several are queued
+                    const messages = payload.type === "batch" ? payload.messages : [payload];
+                    for (const data of messages) {
+                        if (data.type === "transcription" && data.end_of_turn) {
+                            // Display transcription only at end of turn
+                            console.log(`End of turn transcription: ${data.text}`);
                         
-                        // Update the current transcript display
-                        currentTranscript.textContent = data.text;
-                        currentTranscript.classList.add("final-transcript");
+                            // Update the current transcript display
+                            currentTranscript.textContent = data.text;
+                            currentTranscript.classList.add("final-transcript");
                         
-                        // Add to transcription history
-                        addToTranscriptionHistory(data.text);
+                            // Add to transcription history
+                            addToTranscriptionHistory(data.text);
                         
-                        // Update status
-                        statusDisplay.textContent = "Turn completed. Continue speaking or stop recording.";
+                            // Update status
+                            statusDisplay.textContent = "Turn completed. Continue speaking or stop recording.";
                         
-                    } else if (data.type === "turn_end") {
-                        console.log("Turn end detected:", data.message);
-                        statusDisplay.textContent = "Turn detected. Waiting for next speech...";
+                        } else if (data.type === "turn_end") {
+                            console.log("Turn end detected:", data.message);
+                            statusDisplay.textContent = "Turn detected. Waiting for next speech...";
                         
-                        // Reset current transcript display for next turn
-                        setTimeout(() => {
-                            currentTranscript.textContent = "Listening for next speech...";
-                            currentTranscript.classList.remove("final-transcript");
-                        }, 2000);
+                            // Reset current transcript display for next turn
+                            setTimeout(() => {
+                                currentTranscript.textContent = "Listening for next speech...";
+                                currentTranscript.classList.remove("final-transcript");
+                            }, 2000);
                         
-                    } else if (data.type === "error") {
-                        console.error("Transcription error:", data.message);
-                        statusDisplay.textContent = `Error: ${data.message}`;
-                        statusDisplay.classList.add("text-danger");
-                    } else if (data.type === "status") {
-                        console.log("Status message:", data.message);
-                        statusDisplay.textContent = data.message;
+                        } else if (data.type === "error") {
+                            console.error("Transcription error:", data.message);
+                            statusDisplay.textContent = `Error: ${data.message}`;
+                            statusDisplay.classList.add("text-danger");
+                        } else if (data.type === "status") {
+                            console.log("Status message:", data.message);
+                            statusDisplay.textContent = data.message;
+                        }
                     }
                 } catch (err) {
                     console.error("Error parsing WebSocket message:", err, "Raw data:", event.data);
@@ -9,6 +9,7 @@ from uuid import uuid4
 # Import config and services
 import config
 from services import llm
+from services.recorder import SessionRecorder
 
 # AssemblyAI streaming imports
 import assemblyai as aai
@@ -33,6 +34,21 @@ BASE_DIR = PathLib(__file__).resolve().parent
 UPLOADS_DIR = BASE_DIR / "uploads"
 UPLOADS_DIR.mkdir(exist_ok=True)
 
+# Sampled, size-capped debug recordings of /ws audio, written off the event loop
+recorder = SessionRecorder(
+    UPLOADS_DIR,
+    sample_percent=config.RECORDING_SAMPLE_PERCENT,
+    max_file_bytes=config.RECORDING_MAX_FILE_BYTES,
+    max_total_bytes=config.RECORDING_MAX_TOTAL_BYTES,
+    retention_seconds=config.RECORDING_RETENTION_SECONDS,
+)
+
+
+@app.on_event("shutdown")
+def close_recorder():
+    """Flushes and closes any recordings still open."""
+    recorder.close()
+
 
 @app.get("/")
 async def home(request: Request):
@@ -48,7 +64,9 @@ async def websocket_audio_streaming(websocket: WebSocket):
     """
     await websocket.accept()
     file_id = uuid4().hex
-    file_path = UPLOADS_DIR / f"streamed_{file_id}.pcm"
+    # ?record=1 / ?record=0 switches recording on or off for this session; otherwise it is sampled
+    record_param = websocket.query_params.get("record")
+    recording = recorder.open(file_id, None if record_param is None else record_param == "1")
 
     # API key check
     if not config.ASSEMBLYAI_API_KEY:
@@ -121,20 +139,22 @@ async def websocket_audio_streaming(websocket: WebSocket):
         client.connect(StreamingParameters(sample_rate=16000, format_turns=True))
         await websocket.send_text(json.dumps({"type": "status", "message": "Connected to transcription service"}))
 
-        with open(file_path, "wb") as f:
-            while True:
-                msg = await websocket.receive()
-                if "bytes" in msg:
-                    pcm = msg["bytes"]
-                    f.write(pcm)
-                    client.stream(pcm)  # AssemblyAI ko bhejo
-                elif msg.get("text") == "EOF":
-                    break
+        while True:
+            msg = await websocket.receive()
+            if "bytes" in msg:
+                pcm = msg["bytes"]
+                if recording:
+                    recording.write(pcm)  # recorder thread likhega
+                client.stream(pcm)  # AssemblyAI ko bhejo
+            elif msg.get("text") == "EOF":
+                break
 
     except WebSocketDisconnect:
         print("⚠️ Client disconnected")
     finally:
+        if recording:
+            recording.close()
         sender_task.cancel()
         client.disconnect(terminate=True)
         await websocket.close()
-        print(f"🔴 Session ended, file saved at {file_path}")
\ No newline at end of file
+        print(f"🔴 Session ended{', audio recorded' if recording else ''}")
\ No newline at end of file
@@ -5,3 +5,9 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MURF_API_KEY = os.getenv("MURF_API_KEY")
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
+
+# Debug recordings of /ws audio in uploads/: share of sessions recorded, size caps and retention
+RECORDING_SAMPLE_PERCENT = float(os.getenv("RECORDING_SAMPLE_PERCENT", 10))
+RECORDING_MAX_FILE_BYTES = int(os.getenv("RECORDING_MAX_FILE_BYTES", 50 * 1024 * 1024))
+RECORDING_MAX_TOTAL_BYTES = int(os.getenv("RECORDING_MAX_TOTAL_BYTES", 1024 * 1024 * 1024))
+RECORDING_RETENTION_SECONDS = float(os.getenv("RECORDING_RETENTION_SECONDS", 7 * 24 * 3600))
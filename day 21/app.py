@@ -1,20 +1,23 @@
 # main.py
-from fastapi import FastAPI, Request, UploadFile, File, Path, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, Request, Response, UploadFile, File, Path, Query, WebSocket, WebSocketDisconnect
 from fastapi.responses import JSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from typing import Dict, List, Any, Type
+from typing import Optional, Type
 import logging
 from pathlib import Path as PathLib
 from uuid import uuid4
 import json
 import asyncio
 import time
-import threading
 
 # Import the config file FIRST to load dotenv and configure APIs
 import config
-from services import stt, llm, tts
+from services import stt, llm, tts, http_client
+from services.message_pump import MessagePump
+from services.recorder import SessionRecorder
+from services.session_store import SessionStore
+from services.voice_catalog import VoiceCatalog
 from schemas import TTSRequest
 
 # AssemblyAI streaming imports
@@ -39,14 +42,62 @@ app = FastAPI()
 app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
-# In-memory store for chat histories.
-chat_histories: Dict[str, List[Dict[str, Any]]] = {}
+# Bounded store for chat histories (LRU + idle TTL, optional SQLite persistence).
+chat_histories = SessionStore(
+    max_sessions=config.SESSION_MAX_ENTRIES,
+    max_bytes=config.SESSION_MAX_BYTES,
+    ttl_seconds=config.SESSION_TTL_SECONDS,
+    db_path=config.SESSION_DB_PATH,
+)
+
+# Murf voice list, refreshed hourly and served stale for up to a day while refreshing
+voice_catalog = VoiceCatalog(tts.get_available_voices, ttl=3600, stale_ttl=24 * 3600)
+VOICE_CATALOG_MAX_AGE = 300
 
 # Base directory and uploads folder
 BASE_DIR = PathLib(__file__).resolve().parent
 UPLOADS_DIR = BASE_DIR / "uploads"
 UPLOADS_DIR.mkdir(exist_ok=True)
 
+# Sampled, size-capped debug recordings of /ws audio, written off the event loop
+recorder = SessionRecorder(
+    UPLOADS_DIR,
+    sample_percent=config.RECORDING_SAMPLE_PERCENT,
+    max_file_bytes=config.RECORDING_MAX_FILE_BYTES,
+    max_total_bytes=config.RECORDING_MAX_TOTAL_BYTES,
+    retention_seconds=config.RECORDING_RETENTION_SECONDS,
+)
+
+
+@app.on_event("startup")
+async def open_http_client():
+    """Opens the shared keep-alive HTTP client used for Murf REST calls."""
+    await http_client.startup()
+
+
+@app.on_event("shutdown")
+async def close_http_client():
+    """Closes the shared HTTP client and its pooled connections."""
+    await http_client.shutdown()
+
+
+@app.on_event("shutdown")
+async def close_murf_streams():
+    """Closes the shared Murf stream-input connections."""
+    await llm.murf_streams.close()
+
+
+@app.on_event("shutdown")
+def close_session_store():
+    """Flushes pending chat history writes before the server exits."""
+    chat_histories.close()
+
+
+@app.on_event("shutdown")
+def close_recorder():
+    """Flushes and closes any recordings still open."""
+    recorder.close()
+
 
 @app.get("/")
 async def home(request: Request):
@@ -84,7 +135,7 @@ async def agent_chat(
         chat_histories[session_id] = updated_history
 
         # Step 4: Convert the LLM's text response to speech
-        audio_url = tts.convert_text_to_speech(llm_response_text)
+        audio_url = await tts.convert_text_to_speech(llm_response_text)
 
         if audio_url:
             return JSONResponse(content={"audio_url": audio_url})
@@ -100,7 +151,7 @@ async def agent_chat(
 async def tts_endpoint(request: TTSRequest):
     """Endpoint for the simple Text-to-Speech utility."""
     try:
-        audio_url = tts.convert_text_to_speech(request.text, request.voiceId)
+        audio_url = await tts.convert_text_to_speech(request.text, request.voiceId)
         if audio_url:
             return JSONResponse(content={"audio_url": audio_url})
         else:
@@ -110,21 +161,37 @@ async def tts_endpoint(request: TTSRequest):
 
 
 @app.get("/voices")
-async def get_voices():
-    """Fetches the list of available voices from Murf AI."""
+async def get_voices(
+    request: Request,
+    locale: Optional[str] = None,
+    gender: Optional[str] = None,
+    style: Optional[str] = None,
+    page: int = Query(1, ge=1),
+    page_size: Optional[int] = Query(None, ge=1, le=500),
+):
+    """Lists Murf AI voices from the cached catalog, optionally filtered and paginated."""
     try:
-        voices = tts.get_available_voices()
-        return JSONResponse(content={"voices": voices})
+        voices, total, etag = await voice_catalog.query(locale, gender, style, page, page_size)
     except Exception as e:
         return JSONResponse(status_code=500, content={"error": f"Failed to fetch voices: {e}"})
 
+    headers = {"ETag": f'"{etag}"', "Cache-Control": f"private, max-age={VOICE_CATALOG_MAX_AGE}"}
+    if request.headers.get("if-none-match") in (etag, f'"{etag}"'):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(
+        content={"voices": voices, "total": total, "page": page, "page_size": page_size or total},
+        headers=headers,
+    )
+
 
 @app.websocket("/ws")
 async def websocket_audio_streaming(websocket: WebSocket):
     """Receive PCM audio chunks from client and transcribe in real-time using AssemblyAI with turn detection."""
     await websocket.accept()
     file_id = uuid4().hex
-    file_path = UPLOADS_DIR / f"streamed_{file_id}.pcm"
+    # ?record=1 / ?record=0 switches recording on or off for this session; otherwise it is sampled
+    record_param = websocket.query_params.get("record")
+    recording = recorder.open(file_id, None if record_param is None else record_param == "1")
 
     # Check if AssemblyAI API key is configured
     if not config.ASSEMBLYAI_API_KEY:
@@ -153,8 +220,11 @@ async def websocket_audio_streaming(websocket: WebSocket):
         await websocket.close(code=1000, reason="Murf API key not configured")
         return
 
-    # Create a queue for transcription messages
-    transcription_queue = asyncio.Queue()
+    # AssemblyAI callbacks run on its own thread; turns are handed back to this loop
+    loop = asyncio.get_running_loop()
+
+    # Outbound messages to the client; safe to use from AssemblyAI's callback thread
+    outbox = MessagePump(websocket)
     
     # Session history for WebSocket connection
     session_history = []
@@ -173,44 +243,42 @@ async def websocket_audio_streaming(websocket: WebSocket):
 
     # Define async function to process LLM with Murf integration and stream audio to client
     async def process_llm_with_murf_and_stream_audio(transcript_text: str):
-        """Process LLM streaming response with Murf integration and stream audio to client"""
+        """Process LLM streaming response with Murf integration, forwarding audio chunks as Murf emits them"""
         nonlocal session_history
+        audio_queue = asyncio.Queue()
+
+        async def generate():
+            try:
+                return await llm.get_llm_streaming_response_with_murf(transcript_text, session_history, audio_queue)
+            finally:
+                audio_queue.put_nowait(None)  # end of audio for this turn
+
+        producer = asyncio.create_task(generate())
         try:
-            llm_response_text, updated_history, audio_chunks = await llm.get_llm_streaming_response_with_murf(transcript_text, session_history)
+            # Forward each chunk while Gemini and Murf are still producing the rest
+            chunks_sent = 0
+            while True:
+                chunk = await audio_queue.get()
+                if chunk is None:
+                    break
+                chunks_sent += 1
+                await websocket.send_text(json.dumps({
+                    "type": "audio_chunk",
+                    "chunk_index": chunks_sent,
+                    "audio_data": chunk
+                }))
+
+            llm_response_text, updated_history, audio_chunks = await producer
             session_history = updated_history
             print()  # New line after streaming response
-            print(f"\nReceived {len(audio_chunks)} audio chunks from Murf")
-            
-            # Stream audio chunks to client
-            if audio_chunks:
-                print(f"Streaming {len(audio_chunks)} audio chunks to client...")
-                for i, chunk in enumerate(audio_chunks):
-                    try:
-                        await websocket.send_text(json.dumps({
-                            "type": "audio_chunk",
-                            "chunk_index": i + 1,
-                            "total_chunks": len(audio_chunks),
-                            "audio_data": chunk,
-                            "is_final": i == len(audio_chunks) - 1
-                        }))
-                        print(f"Sent audio chunk {i + 1}/{len(audio_chunks)} to client")
-                    except Exception as chunk_error:
-                        print(f"Error sending audio chunk {i + 1}: {chunk_error}")
-                        break
-                
-                # Send completion message
-                try:
-                    await websocket.send_text(json.dumps({
-                        "type": "audio_complete",
-                        "message": "Audio streaming completed",
-                        "total_chunks": len(audio_chunks)
-                    }))
-                    print("Audio streaming completed")
-                except Exception as complete_error:
-                    print(f"Error sending completion message: {complete_error}")
-            else:
-                print("No audio chunks received from Murf")
-                
+            print(f"\nStreamed {chunks_sent} audio chunks from Murf to client")
+
+            await websocket.send_text(json.dumps({
+                "type": "audio_complete",
+                "message": "Audio streaming completed",
+                "total_chunks": chunks_sent
+            }))
+
         except Exception as e:
             print(f"\nError in LLM/Murf integration: {e}")
             try:
@@ -220,22 +288,29 @@ async def websocket_audio_streaming(websocket: WebSocket):
                 }))
             except:
                 pass
+        finally:
+            if not producer.done():
+                producer.cancel()
 
-    def process_llm_with_murf_sync(transcript_text: str):
-        """Synchronous wrapper that runs async function in new event loop"""
-        def run_in_thread():
-            new_loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(new_loop)
+    # One pipeline worker per connection: turns run in order on this loop
+    turn_queue = asyncio.Queue()
+
+    async def turn_worker():
+        while True:
+            transcript_text = await turn_queue.get()
             try:
-                new_loop.run_until_complete(process_llm_with_murf_and_stream_audio(transcript_text))
-            except Exception as e:
-                print(f"\nError in thread: {e}")
+                # A turn that hangs must not hold up every later turn of the session
+                await asyncio.wait_for(
+                    process_llm_with_murf_and_stream_audio(transcript_text), config.TURN_TIMEOUT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                print(f"\nTurn timed out after {config.TURN_TIMEOUT_SECONDS:.0f} s: {transcript_text}")
+                outbox.send({
+                    "type": "error",
+                    "message": "Error generating response: timed out"
+                })
             finally:
-                new_loop.close()
-        
-        thread = threading.Thread(target=run_in_thread)
-        thread.daemon = True
-        thread.start()
+                turn_queue.task_done()
 
     # Define event handlers
     def on_begin(self: Type[StreamingClient], event: BeginEvent):
@@ -261,39 +336,32 @@ async def websocket_audio_streaming(websocket: WebSocket):
             print(f"\nUser: {transcript_text}")
             
             # Put final transcription in queue for async sending
-            try:
-                transcription_queue.put_nowait({
-                    "type": "transcription",
-                    "text": transcript_text,
-                    "is_final": True,
-                    "end_of_turn": True
-                })
-                
-                # Send explicit end-of-turn notification
-                transcription_queue.put_nowait({
-                    "type": "turn_end",
-                    "message": "User stopped talking"
-                })
-                
-                # Process LLM streaming response with Murf integration and stream audio
-                print("Assistant: ", end="", flush=True)
-                process_llm_with_murf_sync(transcript_text)
-                
-            except asyncio.QueueFull:
-                print("Transcription queue is full")
+            outbox.send({
+                "type": "transcription",
+                "text": transcript_text,
+                "is_final": True,
+                "end_of_turn": True
+            })
+
+            # Send explicit end-of-turn notification
+            outbox.send({
+                "type": "turn_end",
+                "message": "User stopped talking"
+            })
+
+            # Hand the turn to the pipeline worker on the server loop
+            print("Assistant: ", end="", flush=True)
+            loop.call_soon_threadsafe(turn_queue.put_nowait, transcript_text)
 
     def on_terminated(self: Type[StreamingClient], event: TerminationEvent):
         print(f"Session ended - {event.audio_duration_seconds:.1f}s processed")
 
     def on_error(self: Type[StreamingClient], error: StreamingError):
         print(f"Transcription error: {error}")
-        try:
-            transcription_queue.put_nowait({
-                "type": "error",
-                "message": f"Transcription error: {error}"
-            })
-        except asyncio.QueueFull:
-            pass
+        outbox.send({
+            "type": "error",
+            "message": f"Transcription error: {error}"
+        })
 
     # Register event handlers
     client.on(StreamingEvents.Begin, on_begin)
@@ -301,20 +369,9 @@ async def websocket_audio_streaming(websocket: WebSocket):
     client.on(StreamingEvents.Termination, on_terminated)
     client.on(StreamingEvents.Error, on_error)
 
-    # Task to send transcription messages to client
-    async def send_transcriptions():
-        while True:
-            try:
-                message = await asyncio.wait_for(transcription_queue.get(), timeout=0.1)
-                await websocket.send_text(json.dumps(message))
-                transcription_queue.task_done()
-            except asyncio.TimeoutError:
-                continue
-            except Exception:
-                break
-
-    # Start the transcription sender task
-    sender_task = asyncio.create_task(send_transcriptions())
+    # Start the outbound message pump and turn worker task
+    outbox.start()
+    worker_task = asyncio.create_task(turn_worker())
 
     # Connect to AssemblyAI streaming service
     try:
@@ -332,27 +389,30 @@ async def websocket_audio_streaming(websocket: WebSocket):
             "message": "Connected to transcription service with turn detection and audio streaming"
         }))
 
-        # Save audio to file for debugging (optional)
-        with open(file_path, "wb") as f:
-            while True:
-                message = await websocket.receive()
-                
-                if "bytes" in message:
-                    pcm_data = message["bytes"]
-                    f.write(pcm_data)  # Save to file for debugging
-                    client.stream(pcm_data)  # Send to AssemblyAI for transcription
-                    
-                elif message.get("text") == "EOF":
-                    print("Recording finished")
-                    break
+        while True:
+            message = await websocket.receive()
+
+            if "bytes" in message:
+                pcm_data = message["bytes"]
+                if recording:
+                    recording.write(pcm_data)  # Queued for the recorder thread
+                client.stream(pcm_data)  # Send to AssemblyAI for transcription
+
+            elif message.get("text") == "EOF":
+                print("Recording finished")
+                break
 
     except WebSocketDisconnect:
         print("Client disconnected")
     except Exception as e:
         print(f"WebSocket error: {str(e)}")
     finally:
-        # Cancel the sender task
-        sender_task.cancel()
+        if recording:
+            recording.close()
+
+        # Stop the turn worker and flush pending messages
+        worker_task.cancel()
+        await outbox.close()
         
         # Clean up AssemblyAI connection
         try:
@@ -5,3 +5,18 @@ load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 MURF_API_KEY = os.getenv("MURF_API_KEY")
 ASSEMBLYAI_API_KEY = os.getenv("ASSEMBLYAI_API_KEY")
+
+# Chat history store limits; set SESSION_DB_PATH to persist histories to SQLite
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", 1000))
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", 32 * 1024 * 1024))
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", 6 * 3600))
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH")
+
+# Debug recordings of /ws audio in uploads/: share of sessions recorded, size caps and retention
+RECORDING_SAMPLE_PERCENT = float(os.getenv("RECORDING_SAMPLE_PERCENT", 10))
+RECORDING_MAX_FILE_BYTES = int(os.getenv("RECORDING_MAX_FILE_BYTES", 50 * 1024 * 1024))
+RECORDING_MAX_TOTAL_BYTES = int(os.getenv("RECORDING_MAX_TOTAL_BYTES", 1024 * 1024 * 1024))
+RECORDING_RETENTION_SECONDS = float(os.getenv("RECORDING_RETENTION_SECONDS", 7 * 24 * 3600))
+
+# Longest one /ws turn (Gemini + Murf audio) may run before it is abandoned
+TURN_TIMEOUT_SECONDS = float(os.getenv("TURN_TIMEOUT_SECONDS", 60))
@@ -0,0 +1,40 @@
+# services/http_client.py
+import asyncio
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+# One keep-alive pool for the whole app, opened on startup and closed on shutdown
+TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+LIMITS = httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=60.0)
+MAX_CONNECTIONS_PER_HOST = 10
+
+_client: Optional[httpx.AsyncClient] = None
+_host_slots: Dict[str, asyncio.Semaphore] = {}
+
+
+async def startup():
+    """Opens the shared client (called from the FastAPI startup hook)."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=TIMEOUT, limits=LIMITS)
+
+
+async def shutdown():
+    """Closes the shared client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _host_slots.clear()
+
+
+async def request(method: str, url: str, **kwargs) -> httpx.Response:
+    """Sends a request through the shared pool, at most MAX_CONNECTIONS_PER_HOST at a time per host."""
+    if _client is None:
+        await startup()
+    host = urlsplit(url).netloc
+    slots = _host_slots.setdefault(host, asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST))
+    async with slots:
+        return await _client.request(method, url, **kwargs)
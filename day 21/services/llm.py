@@ -2,12 +2,13 @@
 
 import google.generativeai as genai
 import websockets
-import json
 import asyncio
 import re
 import logging
 import os
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
+
+from services.murf_stream import MurfContext, MurfStreamManager
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -23,6 +24,12 @@ else:
 if not MURF_API_KEY:
     print("Warning: MURF_API_KEY not found in .env file.")
 
+# Longest wait for Murf's remaining audio once all text has been sent
+MURF_RECEIVE_TIMEOUT = float(os.getenv("MURF_RECEIVE_TIMEOUT", 30))
+
+# Shared stream-input connections; each turn gets its own context on them
+murf_streams = MurfStreamManager(MURF_API_KEY, voice_id="en-US-darnell", style="Conversational")
+
 def get_llm_response(user_query: str, history: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]]]:
     """Gets a response from the Gemini LLM and updates chat history."""
     model = genai.GenerativeModel('gemini-1.5-flash')
@@ -30,29 +37,23 @@ def get_llm_response(user_query: str, history: List[Dict[str, Any]]) -> Tuple[st
     response = chat.send_message(user_query)
     return response.text, chat.history
 
-async def receive_loop(ws):
-    """Receive audio chunks from Murf WebSocket"""
+async def receive_loop(context: MurfContext, audio_queue: Optional[asyncio.Queue] = None):
+    """Receive this turn's audio chunks from Murf, pushing each one to audio_queue as soon as it arrives"""
     audio_chunks = []
     chunk_count = 1
     try:
-        while True:
-            response = await ws.recv()
-            data = json.loads(response)
-            
-            if "audio" in data and data["audio"]:
-                base64_chunk = data["audio"]
-                max_len = 64
-                if len(base64_chunk) > max_len:
-                    truncated_chunk = f"{base64_chunk[:30]}...{base64_chunk[-30:]}"
-                else:
-                    truncated_chunk = base64_chunk
-                print(f"[murf ai][chunk {chunk_count}] {truncated_chunk}")
-                audio_chunks.append(base64_chunk)
-                chunk_count += 1
-            
-            if data.get("final"):
-                logger.info("Murf confirms final audio chunk received.")
-                break
+        async for base64_chunk in context.chunks():
+            max_len = 64
+            if len(base64_chunk) > max_len:
+                truncated_chunk = f"{base64_chunk[:30]}...{base64_chunk[-30:]}"
+            else:
+                truncated_chunk = base64_chunk
+            print(f"[murf ai][chunk {chunk_count}] {truncated_chunk}")
+            audio_chunks.append(base64_chunk)
+            if audio_queue is not None:
+                audio_queue.put_nowait(base64_chunk)
+            chunk_count += 1
+        logger.info("Murf confirms final audio chunk received.")
     except websockets.exceptions.ConnectionClosed:
         pass
     except Exception as e:
@@ -78,90 +79,70 @@ def get_llm_streaming_response(user_query: str, history: List[Dict[str, Any]]) -
     
     return accumulated_response, chat.history
 
-async def get_llm_streaming_response_with_murf(user_query: str, history: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, Any]], List[str]]:
+async def get_llm_streaming_response_with_murf(
+    user_query: str,
+    history: List[Dict[str, Any]],
+    audio_queue: Optional[asyncio.Queue] = None
+) -> Tuple[str, List[Dict[str, Any]], List[str]]:
     """
     Gets a streaming response from Gemini LLM, sends sentences to Murf via WebSocket,
     and returns the text response, updated history, and audio chunks.
+    If audio_queue is given, every base64 audio chunk is also put on it the moment Murf emits it.
     """
     if not GEMINI_API_KEY:
         raise ValueError("Gemini API key is missing.")
     if not MURF_API_KEY:
         raise ValueError("Murf API key is missing.")
     
-    context_id = "day20-static-context"  # Static context_id for Murf to avoid context limit errors
-    
+    context = None
+    receiver_task = None
     try:
-        # Connect to Murf WebSocket
-        uri = (
-            f"wss://api.murf.ai/v1/speech/stream-input"
-            f"?api-key={MURF_API_KEY}"
-            f"&sample_rate=44100"
-            f"&channel_type=MONO"
-            f"&format=WAV"
-        )
-        
-        async with websockets.connect(uri) as ws:
-            # Send voice configuration
-            voice_config = {
-                "context_id": context_id,
-                "voice_config": {
-                    "voiceId": "en-US-darnell",
-                    "style": "Conversational"
-                }
-            }
-            await ws.send(json.dumps(voice_config))
-            
-            # Start the audio receiver task
-            receiver_task = asyncio.create_task(receive_loop(ws))
-            
-            # Generate streaming response from Gemini
-            model = genai.GenerativeModel('gemini-1.5-flash')
-            chat = model.start_chat(history=history)
-            stream = chat.send_message(user_query, stream=True)
-            
-            sentence_buffer = ""
-            accumulated_response = ""
-            
-            print("\nGEMINI STREAMING RESPONSE \n")
-            for chunk in stream:
-                if chunk.text:
-                    accumulated_response += chunk.text
-                    sentence_buffer += chunk.text
-                    print(chunk.text, end="", flush=True)
-
-                    # Split into sentences using regex
-                    sentences = re.split(r'(?<=[.?!])\s+', sentence_buffer)
-
-                    if len(sentences) > 1:
-                        # Send complete sentences to Murf
-                        for sentence in sentences[:-1]:
-                            if sentence.strip():
-                                text_msg = {
-                                    "context_id": context_id,
-                                    "text": sentence.strip(),
-                                    "end": False
-                                }
-                                await ws.send(json.dumps(text_msg))
-                        sentence_buffer = sentences[-1]
-
-            # Send final sentence buffer if any
-            if sentence_buffer.strip():
-                text_msg = {
-                    "context_id": context_id,
-                    "text": sentence_buffer.strip(),
-                    "end": True
-                }
-                await ws.send(json.dumps(text_msg))
-
-            print("\nEND OF GEMINI STREAM\n")
-
-            # Wait for all audio chunks from Murf
-            audio_chunks = await receiver_task
-
-            if not accumulated_response:
-                raise ValueError("No response from Gemini LLM stream.")
-
-            return accumulated_response, chat.history, audio_chunks
+        # Reserve a context of our own on a shared Murf connection
+        context = await murf_streams.open_context()
+
+        # Start the audio receiver task
+        receiver_task = asyncio.create_task(receive_loop(context, audio_queue))
+
+        # Generate streaming response from Gemini
+        model = genai.GenerativeModel('gemini-1.5-flash')
+        chat = model.start_chat(history=history)
+        stream = await chat.send_message_async(user_query, stream=True)
+
+        sentence_buffer = ""
+        accumulated_response = ""
+
+        print("\nGEMINI STREAMING RESPONSE \n")
+        async for chunk in stream:
+            if chunk.text:
+                accumulated_response += chunk.text
+                sentence_buffer += chunk.text
+                print(chunk.text, end="", flush=True)
+
+                # Split into sentences using regex
+                sentences = re.split(r'(?<=[.?!])\s+', sentence_buffer)
+
+                if len(sentences) > 1:
+                    # Send complete sentences to Murf
+                    for sentence in sentences[:-1]:
+                        if sentence.strip():
+                            await context.send_text(sentence.strip())
+                    sentence_buffer = sentences[-1]
+
+        # Always end the context, or Murf never sends its final message
+        if sentence_buffer.strip():
+            await context.send_text(sentence_buffer.strip(), end=True)
+        else:
+            await context.end()
+
+        print("\nEND OF GEMINI STREAM\n")
+
+        if not accumulated_response:
+            raise ValueError("No response from Gemini LLM stream.")
+
+        # Wait for all audio chunks from Murf
+        audio_chunks = await asyncio.wait_for(receiver_task, MURF_RECEIVE_TIMEOUT)
+
+        return accumulated_response, chat.history, audio_chunks
 
     except genai.types.generation_types.BlockedPromptException as e:
         logger.error(f"Gemini blocked prompt: {str(e)}")
@@ -172,6 +153,14 @@ async def get_llm_streaming_response_with_murf(user_query: str, history: List[Di
     except websockets.exceptions.ConnectionClosed as e:
         logger.error(f"Murf WebSocket closed: {str(e)}")
         raise
+    except asyncio.TimeoutError:
+        logger.error(f"Murf sent no final audio within {MURF_RECEIVE_TIMEOUT:.0f} s")
+        raise
     except Exception as e:
         logger.error(f"Unexpected error: {str(e)}")
-        raise
\ No newline at end of file
+        raise
+    finally:
+        if receiver_task is not None and not receiver_task.done():
+            receiver_task.cancel()
+        if context is not None:
+            await context.close()
@@ -0,0 +1,226 @@
+# services/murf_stream.py
+"""
+Long-lived, multiplexed connections to Murf's stream-input WebSocket.
+
+Instead of dialing a fresh socket per turn, every turn opens its own context
+(a unique context_id) on a shared connection. One reader task per connection
+routes each incoming message to the queue of the context it belongs to.
+Connections that drop are replaced on demand when the next turn asks for one.
+"""
+import asyncio
+import json
+import logging
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+STREAM_INPUT_URL = "wss://api.murf.ai/v1/speech/stream-input"
+
+
+class MurfContext:
+    """One turn's slot on a shared Murf connection."""
+
+    def __init__(self, manager: "MurfStreamManager", connection: "MurfConnection", context_id: str):
+        self.manager = manager
+        self.connection = connection
+        self.context_id = context_id
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.closed = False
+
+    async def send_text(self, text: str, end: bool = False):
+        await self.connection.send({"context_id": self.context_id, "text": text, "end": end})
+
+    async def end(self):
+        """Marks the end of this turn's text; Murf answers with its final audio."""
+        await self.send_text("", end=True)
+
+    async def chunks(self) -> AsyncIterator[str]:
+        """Yields base64 audio chunks for this turn until Murf marks it final."""
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def close(self):
+        await self.manager.release(self)
+
+
+class MurfConnection:
+    """A single stream-input socket carrying up to `max_contexts` turns at once."""
+
+    def __init__(self, ws, max_contexts: int):
+        self.ws = ws
+        self.max_contexts = max_contexts
+        self.contexts: Dict[str, MurfContext] = {}
+        self.reader = asyncio.create_task(self._read_loop())
+
+    @property
+    def is_open(self) -> bool:
+        return not self.reader.done()
+
+    def has_capacity(self) -> bool:
+        return self.is_open and len(self.contexts) < self.max_contexts
+
+    async def send(self, message: Dict[str, Any]):
+        await self.ws.send(json.dumps(message))
+
+    async def _read_loop(self):
+        error: Exception = ConnectionError("Murf WebSocket closed")
+        try:
+            async for message in self.ws:
+                data = json.loads(message)
+                context = self.contexts.get(data.get("context_id"))
+                if context is None:
+                    # Late audio for a turn that was already released
+                    continue
+                if data.get("audio"):
+                    context.queue.put_nowait(data["audio"])
+                if data.get("final"):
+                    context.queue.put_nowait(None)
+        except websockets.exceptions.ConnectionClosed as e:
+            error = e
+        except Exception as e:
+            logger.error(f"Error in Murf reader: {str(e)}")
+            error = e
+        finally:
+            # Fail every turn still waiting on this socket; the next turn gets a new one
+            for context in self.contexts.values():
+                context.queue.put_nowait(error)
+
+    async def close(self):
+        self.reader.cancel()
+        try:
+            await self.ws.close()
+        except Exception:
+            pass
+
+
+class MurfStreamManager:
+    """
+    Hands out per-turn contexts on a small pool of shared Murf connections.
+      - at most `max_contexts_per_connection` turns share one socket
+      - at most `max_connections` sockets are open; further turns wait for a free slot
+      - closed sockets are dropped and reconnected lazily, with backoff on failure
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str],
+        voice_id: str = "en-US-darnell",
+        style: str = "Conversational",
+        sample_rate: int = 44100,
+        audio_format: str = "WAV",
+        max_contexts_per_connection: int = 5,
+        max_connections: int = 4,
+        connect_retries: int = 3,
+    ):
+        self.api_key = api_key
+        self.voice_id = voice_id
+        self.style = style
+        self.sample_rate = sample_rate
+        self.audio_format = audio_format
+        self.max_contexts_per_connection = max_contexts_per_connection
+        self.max_connections = max_connections
+        self.connect_retries = connect_retries
+        self._connections: List[MurfConnection] = []
+        self._connecting = 0  # connection slots reserved by turns still dialing
+        self._slots = asyncio.Condition()
+
+    async def open_context(self) -> MurfContext:
+        """Reserves a context on a connection with room, connecting if needed."""
+        async with self._slots:
+            while True:
+                self._connections = [c for c in self._connections if c.is_open]
+                connection = next((c for c in self._connections if c.has_capacity()), None)
+                if connection is not None:
+                    context = self._add_context(connection)
+                    break
+                if len(self._connections) + self._connecting < self.max_connections:
+                    # Reserve the connection slot now; dialing (with its backoff) happens outside
+                    self._connecting += 1
+                    break
+                await self._slots.wait()
+
+        if connection is None:
+            try:
+                connection = await self._connect()
+            except BaseException:
+                async with self._slots:
+                    self._connecting -= 1
+                    self._slots.notify_all()
+                raise
+            async with self._slots:
+                self._connecting -= 1
+                self._connections.append(connection)
+                context = self._add_context(connection)
+                # The new socket's spare contexts can take turns that were waiting
+                self._slots.notify_all()
+
+        try:
+            await connection.send({
+                "context_id": context.context_id,
+                "voice_config": {"voiceId": self.voice_id, "style": self.style},
+            })
+        except Exception:
+            await self.release(context)
+            raise
+        return context
+
+    def _add_context(self, connection: MurfConnection) -> MurfContext:
+        context = MurfContext(self, connection, f"turn-{uuid.uuid4().hex}")
+        connection.contexts[context.context_id] = context
+        return context
+
+    async def release(self, context: MurfContext):
+        """Frees the context's slot and tells Murf to drop anything still queued for it."""
+        if context.closed:
+            return
+        context.closed = True
+        connection = context.connection
+        connection.contexts.pop(context.context_id, None)
+        if connection.is_open:
+            try:
+                await connection.send({"context_id": context.context_id, "clear": True})
+            except Exception:
+                pass
+        await self._notify()
+
+    async def close(self):
+        """Closes every pooled connection (called on server shutdown)."""
+        connections, self._connections = self._connections, []
+        for connection in connections:
+            await connection.close()
+
+    async def _connect(self) -> MurfConnection:
+        uri = (
+            f"{STREAM_INPUT_URL}"
+            f"?api-key={self.api_key}"
+            f"&sample_rate={self.sample_rate}"
+            f"&channel_type=MONO"
+            f"&format={self.audio_format}"
+        )
+        delay = 0.5
+        for attempt in range(1, self.connect_retries + 1):
+            try:
+                ws = await websockets.connect(uri)
+            except (OSError, websockets.exceptions.WebSocketException) as e:
+                if attempt == self.connect_retries:
+                    raise
+                logger.warning(f"Murf connect attempt {attempt} failed, retrying in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+                delay *= 2
+                continue
+            connection = MurfConnection(ws, self.max_contexts_per_connection)
+            # Wake turns waiting for a slot when this socket goes away
+            connection.reader.add_done_callback(lambda _: asyncio.ensure_future(self._notify()))
+            return connection
+
+    async def _notify(self):
+        async with self._slots:
+            self._slots.notify_all()
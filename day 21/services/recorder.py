@@ -0,0 +1,167 @@
+# services/recorder.py
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+_CLOSE = object()
+_STOP = object()
+
+
+class Recording:
+    """Handle for one session's PCM recording; write() only queues, never touches disk."""
+
+    def __init__(self, recorder: "SessionRecorder", session_id: str):
+        self.recorder = recorder
+        self.session_id = session_id
+        self.closed = False
+
+    def write(self, data: bytes):
+        if not self.closed:
+            self.recorder._submit(self, data)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.recorder._submit(self, _CLOSE)
+
+
+class SessionRecorder:
+    """
+    Records raw PCM from /ws sessions into `directory` on a background thread.
+      - only `sample_percent` % of sessions are recorded unless a session opts in or out
+      - files are written through `buffer_bytes` buffers and rotated to a new part
+        once they reach `max_file_bytes`
+      - a janitor deletes recordings older than `retention_seconds`, then the oldest
+        ones until the directory holds at most `max_total_bytes`
+      - if the writer falls behind by more than `max_pending_chunks`, new chunks are dropped
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        sample_percent: float = 10.0,
+        max_file_bytes: int = 50 * 1024 * 1024,
+        max_total_bytes: int = 1024 * 1024 * 1024,
+        retention_seconds: float = 7 * 24 * 3600,
+        buffer_bytes: int = 1024 * 1024,
+        max_pending_chunks: int = 4096,
+        janitor_interval: float = 600,
+    ):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.sample_percent = sample_percent
+        self.max_file_bytes = max_file_bytes
+        self.max_total_bytes = max_total_bytes
+        self.retention_seconds = retention_seconds
+        self.buffer_bytes = buffer_bytes
+        self.janitor_interval = janitor_interval
+        self.dropped_chunks = 0
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_pending_chunks)
+        # recording -> (open file, current part, bytes in current part)
+        self._files: Dict[Recording, list] = {}
+        self._writer = threading.Thread(target=self._run, name="session-recorder", daemon=True)
+        self._writer.start()
+
+    def open(self, session_id: str, enabled: Optional[bool] = None) -> Optional[Recording]:
+        """Starts recording a session; returns None if it is not sampled (or switched off)."""
+        if enabled is None:
+            enabled = random.uniform(0, 100) < self.sample_percent
+        return Recording(self, session_id) if enabled else None
+
+    def close(self):
+        """Flushes and closes every open file, then stops the writer thread."""
+        self._queue.put((None, _STOP))
+        self._writer.join()
+
+    def _submit(self, recording: Recording, data):
+        try:
+            self._queue.put_nowait((recording, data))
+        except queue.Full:
+            if data is _CLOSE:
+                self._queue.put((recording, data))
+            else:
+                self.dropped_chunks += 1
+
+    # ---------------- WRITER THREAD ----------------
+    def _run(self):
+        next_cleanup = 0.0
+        while True:
+            now = time.monotonic()
+            if now >= next_cleanup:
+                self._cleanup()
+                next_cleanup = now + self.janitor_interval
+            try:
+                recording, data = self._queue.get(timeout=max(0.0, next_cleanup - now))
+            except queue.Empty:
+                continue
+            try:
+                if data is _STOP:
+                    for rec in list(self._files):
+                        self._close_file(rec)
+                    return
+                if data is _CLOSE:
+                    self._close_file(recording)
+                else:
+                    self._write(recording, data)
+            except OSError as e:
+                logger.error(f"Recorder I/O error for session {recording.session_id}: {e}")
+
+    def _path(self, recording: Recording, part: int) -> Path:
+        suffix = "" if part == 0 else f"_part{part}"
+        return self.directory / f"streamed_{recording.session_id}{suffix}.pcm"
+
+    def _write(self, recording: Recording, data: bytes):
+        entry = self._files.get(recording)
+        if entry is None:
+            entry = [open(self._path(recording, 0), "wb", buffering=self.buffer_bytes), 0, 0]
+            self._files[recording] = entry
+        elif entry[2] + len(data) > self.max_file_bytes:
+            entry[0].close()
+            entry[1] += 1
+            entry[0] = open(self._path(recording, entry[1]), "wb", buffering=self.buffer_bytes)
+            entry[2] = 0
+        entry[0].write(data)
+        entry[2] += len(data)
+
+    def _close_file(self, recording: Recording):
+        entry = self._files.pop(recording, None)
+        if entry is not None:
+            entry[0].close()
+
+    def _cleanup(self):
+        active = {Path(entry[0].name) for entry in self._files.values()}
+        cutoff = time.time() - self.retention_seconds
+        files = []
+        for path in self.directory.glob("streamed_*.pcm"):
+            if path in active:
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if stat.st_mtime < cutoff:
+                self._remove(path)
+            else:
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_total_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    @staticmethod
+    def _remove(path: Path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove old recording {path}: {e}")
@@ -0,0 +1,202 @@
+# services/session_store.py
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _to_message(item: Any) -> Dict[str, Any]:
+    """Normalizes a chat turn (dict or Gemini Content) into a plain role/parts dict."""
+    if isinstance(item, dict):
+        role, parts = item.get("role"), item.get("parts", [])
+    else:
+        role, parts = item.role, item.parts
+    return {
+        "role": role,
+        "parts": [p if isinstance(p, str) else getattr(p, "text", "") for p in parts],
+    }
+
+
+class SessionStore:
+    """
+    Bounded store for chat histories keyed by session id.
+
+    Behaves like the dict it replaces (get / [] / [] = / in / del), but:
+      - keeps at most `max_sessions` histories and `max_bytes` of serialized
+        history in memory, evicting the least recently used first
+      - drops sessions idle for longer than `ttl_seconds`
+      - with `db_path`, persists histories to SQLite (WAL mode); writes are
+        batched by a background thread every `flush_interval` seconds, and
+        sessions evicted from memory are reloaded from disk on demand
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1000,
+        max_bytes: int = 32 * 1024 * 1024,
+        ttl_seconds: float = 6 * 3600,
+        db_path: Optional[str] = None,
+        flush_interval: float = 2.0,
+    ):
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.flush_interval = flush_interval
+
+        # session_id -> (history, serialized size, last used)
+        self._sessions: "OrderedDict[str, Tuple[List[Dict[str, Any]], int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._dirty: Dict[str, Optional[str]] = {}
+
+        self._db = None
+        self._stop = threading.Event()
+        self._flusher = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                "session_id TEXT PRIMARY KEY, history TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._db_lock = threading.Lock()
+            self._flusher = threading.Thread(target=self._flush_loop, name="session-store-flush", daemon=True)
+            self._flusher.start()
+
+    # ---------------- DICT INTERFACE ----------------
+    def get(self, session_id: str, default: Any = None) -> Any:
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._sessions.get(session_id)
+            if entry is not None:
+                self._sessions.move_to_end(session_id)
+                self._sessions[session_id] = (entry[0], entry[1], now)
+                return list(entry[0])
+
+        history = self._load(session_id, now)
+        if history is None:
+            return default
+        with self._lock:
+            self._store(session_id, history, now)
+        return list(history)
+
+    def __getitem__(self, session_id: str) -> List[Dict[str, Any]]:
+        history = self.get(session_id)
+        if history is None:
+            raise KeyError(session_id)
+        return history
+
+    def __setitem__(self, session_id: str, history: List[Any]):
+        messages = [_to_message(item) for item in history]
+        serialized = json.dumps(messages)
+        now = time.time()
+        with self._lock:
+            self._evict_expired(now)
+            self._store(session_id, messages, now, len(serialized))
+            if self._db is not None:
+                self._dirty[session_id] = serialized
+
+    def __delitem__(self, session_id: str):
+        with self._lock:
+            entry = self._sessions.pop(session_id, None)
+            if entry is not None:
+                self._bytes -= entry[1]
+            if self._db is not None:
+                self._dirty[session_id] = None
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id) is not None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "bytes": self._bytes, "pending_writes": len(self._dirty)}
+
+    # ---------------- MEMORY ----------------
+    def _store(self, session_id: str, messages: List[Dict[str, Any]], now: float, size: Optional[int] = None):
+        if size is None:
+            size = len(json.dumps(messages))
+        old = self._sessions.pop(session_id, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._sessions[session_id] = (messages, size, now)
+        self._bytes += size
+        while self._sessions and (len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes):
+            _, (_, evicted_size, _) = self._sessions.popitem(last=False)
+            self._bytes -= evicted_size
+
+    def _evict_expired(self, now: float):
+        # Least recently used first, so expired sessions sit at the front
+        while self._sessions:
+            session_id, (_, size, last_used) = next(iter(self._sessions.items()))
+            if now - last_used <= self.ttl_seconds:
+                break
+            self._sessions.popitem(last=False)
+            self._bytes -= size
+
+    # ---------------- SQLITE ----------------
+    def _load(self, session_id: str, now: float) -> Optional[List[Dict[str, Any]]]:
+        if self._db is None:
+            return None
+        with self._lock:
+            if session_id in self._dirty:
+                pending = self._dirty[session_id]
+                return json.loads(pending) if pending is not None else None
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT history FROM sessions WHERE session_id = ? AND updated_at >= ?",
+                (session_id, now - self.ttl_seconds),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def flush(self):
+        """Writes every pending change in one transaction and purges expired rows."""
+        if self._db is None:
+            return
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        now = time.time()
+        upserts = [(sid, data, now) for sid, data in dirty.items() if data is not None]
+        deletes = [(sid,) for sid, data in dirty.items() if data is None]
+        try:
+            with self._db_lock, self._db:
+                if upserts:
+                    self._db.executemany(
+                        "INSERT INTO sessions (session_id, history, updated_at) VALUES (?, ?, ?) "
+                        "ON CONFLICT(session_id) DO UPDATE SET history = excluded.history, updated_at = excluded.updated_at",
+                        upserts,
+                    )
+                if deletes:
+                    self._db.executemany("DELETE FROM sessions WHERE session_id = ?", deletes)
+                self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl_seconds,))
+        except sqlite3.Error as e:
+            logger.error(f"Session store flush failed: {e}")
+            with self._lock:
+                for sid, data in dirty.items():
+                    self._dirty.setdefault(sid, data)
+
+    def _flush_loop(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        """Stops the write-behind thread and flushes what is left."""
+        if self._db is None:
+            return
+        self._stop.set()
+        if self._flusher:
+            self._flusher.join()
+        self.flush()
+        self._db.close()
+        self._db = None
@@ -0,0 +1,52 @@
+# services/singleflight.py
+"""
+Collapses identical concurrent upstream calls into one.
+
+While a call for some key is in flight, further callers with the same key
+wait for that call instead of starting their own, and all of them get its
+result or its exception. Nothing is cached: once the call finishes the key is
+forgotten, and the next caller goes upstream again.
+"""
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable
+
+
+class AsyncSingleFlight:
+    """
+    For coroutines on one event loop. The shared call runs as its own task:
+    a caller that is cancelled stops waiting without affecting the others, and
+    the call itself is cancelled only once every caller has given up on it.
+    """
+
+    def __init__(self):
+        # key -> (task, number of callers still waiting)
+        self._calls: Dict[Hashable, list] = {}
+        self.shared = 0
+
+    async def do(self, key: Hashable, func: Callable[..., Awaitable], *args, **kwargs):
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(func(*args, **kwargs))
+            entry = self._calls[key] = [task, 0]
+            task.add_done_callback(lambda t: self._forget(key, t))
+        else:
+            self.shared += 1
+
+        task = entry[0]
+        entry[1] += 1
+        try:
+            return await asyncio.shield(task)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and not task.done():
+                # Last caller gone: later callers must start afresh, not join a cancelled call
+                self._forget(key, task)
+                task.cancel()
+
+    def _forget(self, key: Hashable, task: asyncio.Future):
+        entry = self._calls.get(key)
+        if entry is not None and entry[0] is task:
+            del self._calls[key]
+        if task.done() and not task.cancelled():
+            # Mark the exception as retrieved even if every caller gave up
+            task.exception()
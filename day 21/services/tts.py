@@ -1,12 +1,19 @@
 # services/tts.py
-import requests
 from typing import List, Dict, Any
 from config import MURF_API_KEY # Import the key from config
+from services import http_client
+from services.singleflight import AsyncSingleFlight
 
 MURF_API_URL = "https://api.murf.ai/v1/speech"
 
-def convert_text_to_speech(text: str, voice_id: str = "en-US-natalie") -> str:
-    """Converts text to speech using Murf AI."""
+# Identical requests made at the same moment share one Murf call
+_generate_flights = AsyncSingleFlight()
+
+async def convert_text_to_speech(text: str, voice_id: str = "en-US-natalie") -> str:
+    """Converts text to speech using Murf AI; concurrent identical requests share one call."""
+    return await _generate_flights.do((text, voice_id), _generate, text, voice_id)
+
+async def _generate(text: str, voice_id: str) -> str:
     if not MURF_API_KEY:
         raise Exception("MURF_API_KEY not configured.")
 
@@ -17,17 +24,17 @@ def convert_text_to_speech(text: str, voice_id: str = "en-US-natalie") -> str:
         "format": "MP3",
         "volume": "100%"
     }
-    response = requests.post(f"{MURF_API_URL}/generate", json=payload, headers=headers)
+    response = await http_client.request("POST", f"{MURF_API_URL}/generate", json=payload, headers=headers)
     response.raise_for_status()
     response_data = response.json()
     return response_data.get("audioFile")
 
-def get_available_voices() -> List[Dict[str, Any]]:
+async def get_available_voices() -> List[Dict[str, Any]]:
     """Fetches the list of available voices from Murf AI."""
     if not MURF_API_KEY:
         raise Exception("MURF_API_KEY not configured.")
 
     headers = {"Accept": "application/json", "api-key": MURF_API_KEY}
-    response = requests.get(f"{MURF_API_URL}/voices", headers=headers)
+    response = await http_client.request("GET", f"{MURF_API_URL}/voices", headers=headers)
     response.raise_for_status()
     return response.json()
\ No newline at end of file
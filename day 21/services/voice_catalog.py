@@ -0,0 +1,118 @@
+# services/voice_catalog.py
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from collections import defaultdict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _norm(value: Optional[str]) -> Optional[str]:
+    return value.strip().lower() if value else None
+
+
+class CatalogSnapshot:
+    """One fetched voice list plus the lookup index built from it."""
+
+    def __init__(self, voices: List[Dict[str, Any]]):
+        self.voices = voices
+        self.fetched_at = time.monotonic()
+        self.etag = hashlib.sha256(json.dumps(voices, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+        # field value -> positions in self.voices
+        self.by_locale: Dict[str, Set[int]] = defaultdict(set)
+        self.by_gender: Dict[str, Set[int]] = defaultdict(set)
+        self.by_style: Dict[str, Set[int]] = defaultdict(set)
+        for i, voice in enumerate(voices):
+            if voice.get("locale"):
+                self.by_locale[_norm(voice["locale"])].add(i)
+            if voice.get("gender"):
+                self.by_gender[_norm(voice["gender"])].add(i)
+            for style in voice.get("availableStyles") or []:
+                self.by_style[_norm(style)].add(i)
+
+    def filter(self, locale: str = None, gender: str = None, style: str = None) -> List[int]:
+        selected = None
+        for index, value in ((self.by_locale, locale), (self.by_gender, gender), (self.by_style, style)):
+            if value is None:
+                continue
+            matches = index.get(_norm(value), set())
+            selected = matches if selected is None else selected & matches
+        return sorted(selected) if selected is not None else list(range(len(self.voices)))
+
+
+class VoiceCatalog:
+    """
+    Caches the Murf voice list in memory.
+      - younger than `ttl`: served as is
+      - older, but within `stale_ttl` more: served as is while one background refresh runs
+      - otherwise (or never fetched): callers wait for a single shared refresh
+    After a failed refresh the old list is served without asking Murf again for `retry_after` seconds.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Awaitable[List[Dict[str, Any]]]],
+        ttl: float = 3600,
+        stale_ttl: float = 24 * 3600,
+        retry_after: float = 60,
+    ):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.retry_after = retry_after
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._retry_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    async def snapshot(self) -> CatalogSnapshot:
+        current = self._snapshot
+        if current is not None:
+            age = time.monotonic() - current.fetched_at
+            if age < self.ttl or time.monotonic() < self._retry_at:
+                return current
+            if age < self.ttl + self.stale_ttl:
+                self._start_refresh()
+                return current
+        return await asyncio.shield(self._start_refresh())
+
+    def _start_refresh(self) -> asyncio.Task:
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+        return self._refresh_task
+
+    async def _refresh(self) -> CatalogSnapshot:
+        try:
+            voices = await self.fetch()
+        except Exception as e:
+            # Keep serving the old list if Murf is unavailable
+            if self._snapshot is not None:
+                logger.warning(f"Voice catalog refresh failed, serving stale list for {self.retry_after:.0f} s: {e}")
+                self._retry_at = time.monotonic() + self.retry_after
+                return self._snapshot
+            raise
+        self._snapshot = CatalogSnapshot(voices)
+        return self._snapshot
+
+    async def query(
+        self,
+        locale: str = None,
+        gender: str = None,
+        style: str = None,
+        page: int = 1,
+        page_size: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], int, str]:
+        """Returns (voices on this page, total matches, etag for this exact query)."""
+        snap = await self.snapshot()
+        positions = snap.filter(locale, gender, style)
+        if page_size:
+            start = (max(page, 1) - 1) * page_size
+            positions_page = positions[start:start + page_size]
+        else:
+            positions_page = positions
+        query_key = json.dumps([snap.etag, _norm(locale), _norm(gender), _norm(style), page, page_size])
+        etag = hashlib.sha256(query_key.encode("utf-8")).hexdigest()[:32]
+        return [snap.voices[i] for i in positions_page], len(positions), etag
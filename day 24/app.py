@@ -9,7 +9,7 @@ import re
 
 # Import services and config
 import config
-from services import stt, llm, tts
+from services import stt, llm, llm_async, tts, tts_pipeline
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -35,6 +35,8 @@ async def websocket_endpoint(websocket: WebSocket):
 
     loop = asyncio.get_event_loop()
     chat_history = []
+    tts_window = tts_pipeline.DEFAULT_PIPELINE_WINDOW
+    turns = set()
 
     # 👇 Persona instruction (change this to try Pirate, Robot, Teacher, etc.)
     PERSONA = """
@@ -47,8 +49,8 @@ async def websocket_endpoint(websocket: WebSocket):
         await websocket.send_json({"type": "final", "text": text})
         try:
             # 1. Get the full text response from the LLM (non-streaming)
-            full_response, updated_history = llm.get_llm_response(
-                text, chat_history, system_prompt=PERSONA
+            full_response, updated_history = await llm_async.run_blocking(
+                llm.get_llm_response, text, chat_history, system_prompt=PERSONA
             )
 
             # Update history for the next turn
@@ -61,16 +63,12 @@ async def websocket_endpoint(websocket: WebSocket):
             # 2. Split the response into sentences
             sentences = re.split(r'(?<=[.?!])\s+', full_response.strip())
 
-            # 3. Process each sentence for TTS and stream audio back
-            for sentence in sentences:
-                if sentence.strip():
-                    # Run the blocking TTS function in a separate thread
-                    audio_bytes = await loop.run_in_executor(
-                        None, tts.speak, sentence.strip()
-                    )
-                    if audio_bytes:
-                        b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-                        await websocket.send_json({"type": "audio", "b64": b64_audio})
+            # 3. Synthesize up to tts_window sentences at once, stream their audio back in order
+            sentences = [sentence.strip() for sentence in sentences if sentence.strip()]
+            async for audio_bytes in tts_pipeline.speak_in_order(sentences, tts.speak, tts_window):
+                if audio_bytes:
+                    b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
+                    await websocket.send_json({"type": "audio", "b64": b64_audio})
 
         except Exception as e:
             logging.error(f"Error in LLM/TTS pipeline: {e}")
@@ -78,7 +76,9 @@ async def websocket_endpoint(websocket: WebSocket):
 
     def on_final_transcript(text: str):
         logging.info(f"Final transcript received: {text}")
-        asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        turn = asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        turns.add(turn)
+        turn.add_done_callback(turns.discard)
 
     transcriber = stt.AssemblyAIStreamingTranscriber(on_final_callback=on_final_transcript)
 
@@ -89,5 +89,8 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         logging.info(f"WebSocket connection closed: {e}")
     finally:
+        # Stop turns still synthesizing for a socket that is gone
+        for turn in list(turns):
+            turn.cancel()
         transcriber.close()
         logging.info("Transcription resources released.")
@@ -0,0 +1,37 @@
+# services/tts_pipeline.py
+"""
+Pipelined sentence synthesis over the blocking tts.speak().
+
+Up to `window` sentences are synthesized at once on the default executor,
+while their audio is still yielded strictly in sentence order: sentence N+1
+renders while sentence N is being sent. Closing or cancelling the consumer
+cancels every synthesis that has not started yet.
+"""
+import asyncio
+import os
+from collections import deque
+from typing import AsyncIterator, Callable, List
+
+# How many sentences of one answer may be synthesized at the same time
+DEFAULT_PIPELINE_WINDOW = int(os.getenv("TTS_PIPELINE_WINDOW", 3))
+MAX_PIPELINE_WINDOW = 8
+
+
+async def speak_in_order(
+    sentences: List[str],
+    speak: Callable[[str], bytes],
+    window: int = DEFAULT_PIPELINE_WINDOW,
+) -> AsyncIterator[bytes]:
+    """Yields speak(sentence) for every sentence, in order, with up to `window` calls in flight."""
+    window = max(1, min(window, MAX_PIPELINE_WINDOW))
+    loop = asyncio.get_running_loop()
+    queued = deque(sentences)
+    in_flight = deque()
+    try:
+        while queued or in_flight:
+            while queued and len(in_flight) < window:
+                in_flight.append(loop.run_in_executor(None, speak, queued.popleft()))
+            yield await in_flight.popleft()
+    finally:
+        for future in in_flight:
+            future.cancel()
@@ -9,7 +9,7 @@ import re
 
 # Import services and config
 import config
-from services import stt, llm, tts
+from services import stt, llm, llm_async, tts, tts_pipeline
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -35,19 +35,21 @@ async def websocket_endpoint(websocket: WebSocket):
 
     loop = asyncio.get_event_loop()
     chat_history = []
+    tts_window = tts_pipeline.DEFAULT_PIPELINE_WINDOW
+    turns = set()
 
     async def handle_transcript(text: str):
         """Processes the final transcript, gets LLM and TTS responses, and streams audio."""
         await websocket.send_json({"type": "final", "text": text})
         try:
-            # 1. Call LLM (blocking → run in executor)
+            # 1. Call LLM (blocking → run on the LLM executor)
             if "search for" in text.lower() or "what is" in text.lower():
-                full_response, updated_history = await loop.run_in_executor(
-                    None, llm.get_web_response, text, chat_history
+                full_response, updated_history = await llm_async.run_blocking(
+                    llm.get_web_response, text, chat_history
                 )
             else:
-                full_response, updated_history = await loop.run_in_executor(
-                    None, llm.get_llm_response, text, chat_history
+                full_response, updated_history = await llm_async.run_blocking(
+                    llm.get_llm_response, text, chat_history
                 )
 
             # Update history
@@ -60,13 +62,12 @@ async def websocket_endpoint(websocket: WebSocket):
             # 2. Split response into sentences for smoother playback
             sentences = re.split(r'(?<=[.?!])\s+', full_response.strip())
 
-            # 3. Convert each sentence to speech
-            for sentence in sentences:
-                if sentence.strip():
-                    audio_bytes = await loop.run_in_executor(None, tts.speak, sentence.strip())
-                    if audio_bytes:
-                        b64_audio = base64.b64encode(audio_bytes).decode("utf-8")
-                        await websocket.send_json({"type": "audio", "b64": b64_audio})
+            # 3. Synthesize up to tts_window sentences at once, stream their audio back in order
+            sentences = [sentence.strip() for sentence in sentences if sentence.strip()]
+            async for audio_bytes in tts_pipeline.speak_in_order(sentences, tts.speak, tts_window):
+                if audio_bytes:
+                    b64_audio = base64.b64encode(audio_bytes).decode("utf-8")
+                    await websocket.send_json({"type": "audio", "b64": b64_audio})
 
         except Exception as e:
             logging.error(f"❌ Error in LLM/TTS pipeline: {e}")
@@ -77,7 +78,9 @@ async def websocket_endpoint(websocket: WebSocket):
     def on_final_transcript(text: str):
         """Callback when AssemblyAI returns a final transcript."""
         logging.info(f"🎤 Final transcript received: {text}")
-        asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        turn = asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        turns.add(turn)
+        turn.add_done_callback(turns.discard)
 
     # Initialize AssemblyAI streaming
     transcriber = stt.AssemblyAIStreamingTranscriber(on_final_callback=on_final_transcript)
@@ -94,5 +97,8 @@ async def websocket_endpoint(websocket: WebSocket):
         logging.error(f"❌ Unexpected WebSocket error: {e}")
 
     finally:
+        # Stop turns still synthesizing for a socket that is gone
+        for turn in list(turns):
+            turn.cancel()
         transcriber.close()
         logging.info("🛑 Transcription resources released.")
@@ -8,7 +8,7 @@ import base64
 import re
 import json
 
-from services import stt, llm, tts
+from services import stt, llm, llm_async, tts, tts_pipeline
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
@@ -32,16 +32,22 @@ async def websocket_endpoint(websocket: WebSocket):
 
     loop = asyncio.get_event_loop()
     chat_history = []
+    tts_window = tts_pipeline.DEFAULT_PIPELINE_WINDOW
+    turns = set()
     api_keys = {}
 
     async def handle_transcript(text: str):
         """Processes the final transcript, gets LLM and TTS responses, and streams audio."""
         await websocket.send_json({"type": "final", "text": text})
         try:
-            if llm.should_search_web(text, api_keys.get("gemini")):
-                full_response, updated_history = llm.get_web_response(text, chat_history, api_keys.get("gemini"), api_keys.get("serpapi"))
+            if await llm_async.run_blocking(llm.should_search_web, text, api_keys.get("gemini")):
+                full_response, updated_history = await llm_async.run_blocking(
+                    llm.get_web_response, text, chat_history, api_keys.get("gemini"), api_keys.get("serpapi")
+                )
             else:
-                full_response, updated_history = llm.get_llm_response(text, chat_history, api_keys.get("gemini"))
+                full_response, updated_history = await llm_async.run_blocking(
+                    llm.get_llm_response, text, chat_history, api_keys.get("gemini")
+                )
             
             chat_history.clear()
             chat_history.extend(updated_history)
@@ -49,14 +55,13 @@ async def websocket_endpoint(websocket: WebSocket):
 
             sentences = re.split(r'(?<=[.?!])\s+', full_response.strip())
             
-            for sentence in sentences:
-                if sentence.strip():
-                    audio_bytes = await loop.run_in_executor(
-                        None, tts.speak, sentence.strip(), api_keys.get("murf")
-                    )
-                    if audio_bytes:
-                        b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-                        await websocket.send_json({"type": "audio", "b64": b64_audio})
+            sentences = [sentence.strip() for sentence in sentences if sentence.strip()]
+            async for audio_bytes in tts_pipeline.speak_in_order(
+                sentences, lambda sentence: tts.speak(sentence, api_keys.get("murf")), tts_window
+            ):
+                if audio_bytes:
+                    b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
+                    await websocket.send_json({"type": "audio", "b64": b64_audio})
 
         except Exception as e:
             logging.error(f"Error in LLM/TTS pipeline: {e}")
@@ -65,13 +70,16 @@ async def websocket_endpoint(websocket: WebSocket):
 
     def on_final_transcript(text: str):
         logging.info(f"Final transcript received: {text}")
-        asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        turn = asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        turns.add(turn)
+        turn.add_done_callback(turns.discard)
 
     try:
         config_data = await websocket.receive_text()
         config = json.loads(config_data)
         if config.get("type") == "config":
             api_keys = config.get("keys", {})
+            tts_window = int(config.get("tts_window", tts_window))
 
         transcriber = stt.AssemblyAIStreamingTranscriber(
             on_final_callback=on_final_transcript, 
@@ -84,6 +92,9 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         logging.info(f"WebSocket connection closed: {e}")
     finally:
+        # Stop turns still synthesizing for a socket that is gone
+        for turn in list(turns):
+            turn.cancel()
         if 'transcriber' in locals() and transcriber:
             transcriber.close()
         logging.info("Transcription resources released.")
\ No newline at end of file
@@ -1,7 +1,9 @@
 # services/llm.py
 import google.generativeai as genai
+from google.ai import generativelanguage as glm
 from typing import List, Dict, Any, Tuple
 from serpapi import GoogleSearch
+import functools
 
 # Configure logging
 import logging
@@ -26,13 +28,24 @@ To be a fun yet reliable partner for coding, research, productivity, and quick p
 """
 
 
+@functools.lru_cache(maxsize=32)
+def _model(api_key: str, system_instruction: str = None) -> genai.GenerativeModel:
+    """
+    GenerativeModel bound to its own client for this key. genai.configure() is
+    process-wide, so sessions with different keys would race on it.
+    """
+    model = genai.GenerativeModel('gemini-1.5-flash', system_instruction=system_instruction)
+    # GenerativeModel only falls back to the global default client when this is unset
+    model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    return model
+
+
 def should_search_web(user_query: str, api_key: str) -> bool:
     """
     Uses a lightweight LLM prompt to decide if a web search is necessary.
     """
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        model = _model(api_key)
         prompt = f"Does the following query require a web search to answer accurately? Respond with only 'yes' or 'no'.\n\nQuery: '{user_query}'"
         response = model.generate_content(prompt)
         return response.text.strip().lower() == "yes"
@@ -43,8 +56,7 @@ def should_search_web(user_query: str, api_key: str) -> bool:
 def get_llm_response(user_query: str, history: List[Dict[str, Any]], api_key: str) -> Tuple[str, List[Dict[str, Any]]]:
     """Gets a response from the Gemini LLM and updates chat history."""
     try:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-1.5-flash', system_instruction=system_instructions)
+        model = _model(api_key, system_instructions)
         chat = model.start_chat(history=history)
         response = chat.send_message(user_query)
         return response.text, chat.history
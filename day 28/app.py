@@ -9,7 +9,7 @@ import re
 import json
 
 # Import services and config
-from services import stt, llm, tts
+from services import stt, llm, llm_async, tts, tts_pipeline
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -35,6 +35,8 @@ async def websocket_endpoint(websocket: WebSocket):
 
     loop = asyncio.get_event_loop()
     chat_history = []
+    tts_window = tts_pipeline.DEFAULT_PIPELINE_WINDOW
+    turns = set()
     api_keys = {}
 
     async def handle_transcript(text: str):
@@ -43,9 +45,13 @@ async def websocket_endpoint(websocket: WebSocket):
         try:
             # 1. Decide whether to search the web
             if llm.should_search_web(text, api_keys.get("gemini")):
-                full_response, updated_history = llm.get_web_response(text, chat_history, api_keys.get("gemini"), api_keys.get("serpapi"))
+                full_response, updated_history = await llm_async.run_blocking(
+                    llm.get_web_response, text, chat_history, api_keys.get("gemini"), api_keys.get("serpapi")
+                )
             else:
-                full_response, updated_history = llm.get_llm_response(text, chat_history, api_keys.get("gemini"))
+                full_response, updated_history = await llm_async.run_blocking(
+                    llm.get_llm_response, text, chat_history, api_keys.get("gemini")
+                )
             
             # Update history for the next turn
             chat_history.clear()
@@ -57,16 +63,14 @@ async def websocket_endpoint(websocket: WebSocket):
             # 2. Split the response into sentences
             sentences = re.split(r'(?<=[.?!])\s+', full_response.strip())
             
-            # 3. Process each sentence for TTS and stream audio back
-            for sentence in sentences:
-                if sentence.strip():
-                    # Run the blocking TTS function in a separate thread
-                    audio_bytes = await loop.run_in_executor(
-                        None, tts.speak, sentence.strip(), api_keys.get("murf")
-                    )
-                    if audio_bytes:
-                        b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-                        await websocket.send_json({"type": "audio", "b64": b64_audio})
+            # 3. Synthesize up to tts_window sentences at once, stream their audio back in order
+            sentences = [sentence.strip() for sentence in sentences if sentence.strip()]
+            async for audio_bytes in tts_pipeline.speak_in_order(
+                sentences, lambda sentence: tts.speak(sentence, api_keys.get("murf")), tts_window
+            ):
+                if audio_bytes:
+                    b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
+                    await websocket.send_json({"type": "audio", "b64": b64_audio})
 
         except Exception as e:
             logging.error(f"Error in LLM/TTS pipeline: {e}")
@@ -75,7 +79,9 @@ async def websocket_endpoint(websocket: WebSocket):
 
     def on_final_transcript(text: str):
         logging.info(f"Final transcript received: {text}")
-        asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        turn = asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        turns.add(turn)
+        turn.add_done_callback(turns.discard)
 
     try:
         # The first message from the client should be the API keys
@@ -83,6 +89,7 @@ async def websocket_endpoint(websocket: WebSocket):
         config = json.loads(config_data)
         if config.get("type") == "config":
             api_keys = config.get("keys", {})
+            tts_window = int(config.get("tts_window", tts_window))
 
         transcriber = stt.AssemblyAIStreamingTranscriber(
             on_final_callback=on_final_transcript, 
@@ -95,6 +102,9 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         logging.info(f"WebSocket connection closed: {e}")
     finally:
+        # Stop turns still synthesizing for a socket that is gone
+        for turn in list(turns):
+            turn.cancel()
         if 'transcriber' in locals() and transcriber:
             transcriber.close()
         logging.info("Transcription resources released.")
\ No newline at end of file
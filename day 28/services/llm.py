@@ -3,8 +3,10 @@ SILLY AI (Smart Interactive Light-hearted Language Yielding AI)
 """
 
 import google.generativeai as genai
+from google.ai import generativelanguage as glm
 from typing import List, Dict, Any, Tuple
 from serpapi import GoogleSearch
+import functools
 import logging
 
 # ---------------- LOGGING ----------------
@@ -31,19 +33,19 @@ part genius researcher 🧠, and part friendly buddy 👯.
 """
 
 # ---------------- INIT GEMINI MODEL ----------------
-chat = None
-
-def init_model(api_key: str):
-    """Initialize persistent Gemini chat model."""
-    global chat
-    if chat is None:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(
-            'gemini-1.5-flash',
-            system_instruction=system_instructions
-        )
-        chat = model.start_chat(history=[])
-    return chat
+@functools.lru_cache(maxsize=32)
+def init_model(api_key: str) -> genai.GenerativeModel:
+    """
+    Gemini model bound to its own client for this key. genai.configure() is
+    process-wide, so sessions with different keys would race on it.
+    """
+    model = genai.GenerativeModel(
+        'gemini-1.5-flash',
+        system_instruction=system_instructions
+    )
+    # GenerativeModel only falls back to the global default client when this is unset
+    model._client = glm.GenerativeServiceClient(client_options={"api_key": api_key})
+    return model
 
 # ---------------- RULE-BASED SEARCH DETECTION ----------------
 def should_search_web(user_query: str, history=None) -> bool:
@@ -91,8 +93,8 @@ def get_llm_response(
         if should_search_web(user_query, history):
             return get_web_response(user_query, history, api_key, serp_api_key="YOUR_SERPAPI_KEY")
 
-        # Persistent Gemini chat
-        chat = init_model(api_key)
+        # Each session's chat is rebuilt from its own history
+        chat = init_model(api_key).start_chat(history=history)
         response = chat.send_message(user_query)
         return response.text, chat.history
 
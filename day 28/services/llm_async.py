@@ -0,0 +1,37 @@
+# services/llm_async.py
+"""
+Async adapter over the blocking calls in services/llm.py.
+
+They run on a small dedicated executor instead of the event loop, so a slow
+Gemini or SerpAPI round trip only suspends the turn that asked for it while
+every other socket keeps streaming audio. Each wait is bounded by a timeout;
+a call that times out or whose turn is cancelled is abandoned and its result
+dropped.
+"""
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 30))
+
+# Bounded pool for blocking LLM calls, kept apart from the default executor used by TTS
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_EXECUTOR_WORKERS", 8)),
+    thread_name_prefix="llm-blocking",
+)
+
+
+async def run_blocking(func, *args, timeout: float = LLM_TIMEOUT_SECONDS, **kwargs):
+    """Runs a blocking llm.py call on the LLM executor and waits at most `timeout` seconds."""
+    loop = asyncio.get_running_loop()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs)), timeout
+        )
+    except asyncio.TimeoutError:
+        logger.error(f"{func.__name__} timed out after {timeout:.0f} s")
+        raise
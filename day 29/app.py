@@ -5,11 +5,18 @@ from fastapi.templating import Jinja2Templates
 import logging
 import asyncio
 import base64
-import re
 import json
+from uuid import uuid4
 
 # Import services and config
-from services import stt, llm, tts
+import config
+from services import stt, llm, llm_async, tts, audio_frames
+from services.endpointing import (
+    ENDPOINT_SILENCE_MS, ENDPOINT_STABLE_MS, HANDLED, LOCAL_ENDPOINTING, REVISED, Endpointer,
+)
+from services.intents import IntentSpotter
+from services.speculation import SPECULATIVE_LLM, Speculator
+from services.turns import BARGE_IN_MIN_WORDS, DEFAULT_TURN_POLICY, TurnScheduler, TurnToken
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -21,6 +28,14 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 templates = Jinja2Templates(directory="templates")
 
 
+@app.on_event("startup")
+async def prerender_quick_replies():
+    """Pins quick-reply audio in memory; renders it now if a server-side Murf key exists, else on first use."""
+    tts.pin_phrases(llm.QUICK_REPLY_TEXTS)
+    if config.MURF_API_KEY:
+        asyncio.create_task(tts.prerender(llm.QUICK_REPLY_TEXTS, config.MURF_API_KEY))
+
+
 @app.get("/")
 async def home(request: Request):
     """Serves the main HTML page."""
@@ -34,67 +49,221 @@ async def websocket_endpoint(websocket: WebSocket):
     logging.info("WebSocket client connected.")
 
     loop = asyncio.get_event_loop()
+    session_id = uuid4().hex
     chat_history = []
     api_keys = {}
+    tts_window = tts.DEFAULT_PIPELINE_WINDOW
+    scheduler = None
+    speculator = None
+    spotter = None
+    endpointer = None
+    binary_audio = False
+    audio_codec = audio_frames.CODECS[tts.STREAM_FORMAT]
+
+    async def send_audio(token: TurnToken, seq: int, audio_chunk: bytes, final: bool):
+        """Sends one audio chunk using the transport negotiated in the config message."""
+        if token.cancelled:
+            return  # the client has already been told to flush this turn
+        turn_id = token.turn_id
+        if binary_audio:
+            await websocket.send_bytes(audio_frames.pack(turn_id, seq, audio_chunk, final, audio_codec))
+        else:
+            b64_audio = base64.b64encode(audio_chunk).decode('utf-8')
+            await websocket.send_json({"type": "audio_chunk", "turn": turn_id, "b64": b64_audio, "seq": seq, "final": final})
+
+    def llm_deltas(text: str, token: TurnToken):
+        """Async stream of LLM text deltas; Gemini is awaited natively, never blocking the loop."""
+        if llm.should_search_web(text, api_keys.get("gemini")):
+            return llm_async.stream_web_response(
+                text, chat_history, api_keys.get("gemini"), api_keys.get("serpapi"), session_id, token=token
+            )
+        return llm_async.stream_llm_response(text, chat_history, api_keys.get("gemini"), session_id, token=token)
+
+    def llm_snapshot():
+        """Captures the chat history so a speculative reply that missed can be taken back."""
+        chat = llm.init_model(api_keys.get("gemini"), session_id)
+        committed_chat, committed_history = list(chat.history), list(chat_history)
 
-    async def handle_transcript(text: str):
-        """Processes the final transcript, gets LLM and TTS responses, and streams audio."""
+        def restore():
+            chat.history = committed_chat
+            chat_history[:] = committed_history
+        return restore
+
+    async def handle_transcript(text: str, token: TurnToken):
+        """Processes the final transcript, streams LLM text and per-sentence TTS audio back."""
+        turn_id = token.turn_id
         await websocket.send_json({"type": "final", "text": text})
         try:
-            # 1. Decide whether to search the web
-            if llm.should_search_web(text, api_keys.get("gemini")):
-                full_response, updated_history = llm.get_web_response(text, chat_history, api_keys.get("gemini"), api_keys.get("serpapi"))
-            else:
-                full_response, updated_history = llm.get_llm_response(text, chat_history, api_keys.get("gemini"))
-            
-            # Update history for the next turn
-            chat_history.clear()
-            chat_history.extend(updated_history)
-
-            # Send the full text response to the UI
-            await websocket.send_json({"type": "assistant", "text": full_response})
-
-            # 2. Split the response into sentences
-            sentences = re.split(r'(?<=[.?!])\s+', full_response.strip())
-            
-            # 3. Process each sentence for TTS and stream audio back
-            for sentence in sentences:
-                if sentence.strip():
-                    # Run the blocking TTS function in a separate thread
-                    audio_bytes = await loop.run_in_executor(
-                        None, tts.speak, sentence.strip(), api_keys.get("murf")
-                    )
-                    if audio_bytes:
-                        b64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-                        await websocket.send_json({"type": "audio", "b64": b64_audio})
+            response_parts = []
+            splitter = tts.SentenceBuffer()
+            # A speculative request started on the partial transcript may already be answering this
+            deltas = await speculator.take(text) if speculator else None
+            if deltas is None:
+                deltas = llm_deltas(text, token)
+
+            async def sentences():
+                # 1. Push text deltas to the UI and release each sentence as soon as it is complete
+                async for delta in deltas:
+                    response_parts.append(delta)
+                    token.output_started = True
+                    await websocket.send_json({"type": "assistant_delta", "turn": turn_id, "text": delta})
+                    for sentence in splitter.feed(delta):
+                        yield sentence
+                tail = splitter.flush()
+                if tail:
+                    yield tail
+
+            # 2. Synthesize sentences concurrently, stream their audio back in order
+            async for _, seq, audio_chunk, final in tts.stream_sentences(
+                sentences(), api_keys.get("murf"), window=tts_window, token=token
+            ):
+                await send_audio(token, seq, audio_chunk, final)
+
+            # 3. Send the complete text response to the UI
+            await websocket.send_json({"type": "assistant", "turn": turn_id, "text": "".join(response_parts)})
 
         except Exception as e:
             logging.error(f"Error in LLM/TTS pipeline: {e}")
             await websocket.send_json({"type": "llm", "text": "Sorry, I encountered an error."})
 
+    def flush_client(token: TurnToken):
+        """Tells the client to drop whatever audio it still has queued for a cancelled turn."""
+        logging.info(f"Turn {token.turn_id} cancelled ({token.reason})")
+        loop.create_task(websocket.send_json({"type": "flush", "turn": token.turn_id}))
 
-    def on_final_transcript(text: str):
+    def barge_in(text: str):
+        """The user is talking again: stop the current turn."""
+        if not scheduler or len(text.split()) < BARGE_IN_MIN_WORDS:
+            return
+        current = scheduler.current
+        if current is not None and not current.cancelled:
+            answering, heard = llm.normalize_utterance(current.text), llm.normalize_utterance(text)
+            # A late partial of the words this turn was started on is not an interruption
+            if answering == heard or answering.startswith(heard + " "):
+                return
+        scheduler.cancel_current("barge-in")
+
+    def answer_early(text: str):
+        """A partial is a whole quick-reply phrase: play its cached audio without waiting for the final."""
+        logging.info(f"Quick reply spotted in partial transcript: {text}")
+        scheduler.submit(text, immediate=True)
+
+    def end_turn_locally(text: str, revises: bool):
+        """Silence and a settled partial say the user is done: answer the partial now."""
+        logging.info(f"Local end of turn: {text}")
+        scheduler.submit(text, immediate=True, revises=revises)
+
+    def on_final(text: str, turn_order: int, formatted: bool):
+        if scheduler.is_redelivery(turn_order, formatted):
+            return
+        local = endpointer.reconcile(text) if endpointer else None
+        if spotter and spotter.reconcile(text):
+            # Already answered from the partial transcript
+            if speculator:
+                speculator.cancel()
+            return
+        if local == HANDLED:
+            if speculator:
+                speculator.cancel()
+            return
+        scheduler.submit(text, revises=local == REVISED)
+
+    # AssemblyAI callbacks arrive on its own thread; hand them to this loop
+    def on_final_transcript(text: str, turn_order: int, formatted: bool):
         logging.info(f"Final transcript received: {text}")
-        asyncio.run_coroutine_threadsafe(handle_transcript(text), loop)
+        loop.call_soon_threadsafe(on_final, text, turn_order, formatted)
+
+    def on_partial(text: str):
+        barge_in(text)
+        if spotter:
+            spotter.on_partial(text)
+        if endpointer:
+            endpointer.on_partial(text)
+        if speculator:
+            speculator.on_partial(text)
+
+    def on_partial_transcript(text: str):
+        loop.call_soon_threadsafe(on_partial, text)
 
     try:
         # The first message from the client should be the API keys
         config_data = await websocket.receive_text()
-        config = json.loads(config_data)
-        if config.get("type") == "config":
-            api_keys = config.get("keys", {})
+        client_config = json.loads(config_data)
+        if client_config.get("type") == "config":
+            api_keys = client_config.get("keys", {})
+            tts_window = int(client_config.get("tts_window", tts_window))
+            # Raw binary audio frames if the client supports them, base64 JSON otherwise
+            binary_audio = client_config.get("audio_transport") == "binary"
+            await websocket.send_json({"type": "config_ack", "audio_transport": "binary" if binary_audio else "json"})
+
+        # One turn at a time per session; overlapping finals are queued, merged or superseded
+        turn_policy = client_config.get("turn_policy")
+        scheduler = TurnScheduler(
+            handle_transcript,
+            policy=turn_policy if turn_policy in TurnScheduler.POLICIES else DEFAULT_TURN_POLICY,
+            on_cancel=flush_client,
+        )
+        scheduler.start()
+        idle = lambda: not (scheduler.current and scheduler.current.running)
+
+        # Opt-in: start the LLM on a partial transcript that has stopped changing
+        if client_config.get("speculative", SPECULATIVE_LLM):
+            speculator = Speculator(
+                llm_deltas,
+                llm_snapshot,
+                can_start=idle,
+            )
 
+        # Declare end of turn from VAD silence and a settled partial instead of waiting for AssemblyAI
+        local_endpointing = bool(client_config.get("local_endpointing", LOCAL_ENDPOINTING))
         transcriber = stt.AssemblyAIStreamingTranscriber(
+            on_partial_callback=on_partial_transcript,
             on_final_callback=on_final_transcript, 
-            api_key=api_keys.get("assemblyai")
+            api_key=api_keys.get("assemblyai"),
+            # Upstream finals are only checked against local decisions then; skip the formatting round trip
+            format_turns=not local_endpointing,
         )
+        # Greetings, thanks and farewells are answered from cached audio as soon as the partial is certain
+        if client_config.get("early_quick_replies", True) and transcriber.vad:
+            spotter = IntentSpotter(
+                llm.QUICK_REPLY_TRIE,
+                answer_early,
+                can_fire=lambda: idle() and not (endpointer and endpointer.fired),
+            )
+        if local_endpointing and transcriber.vad:
+            endpointer = Endpointer(
+                end_turn_locally,
+                can_end=lambda: idle() and not (spotter and spotter.fired),
+                current_turn=lambda: scheduler.current,
+                silence_ms=int(client_config.get("endpoint_silence_ms", ENDPOINT_SILENCE_MS)),
+                stable_ms=int(client_config.get("endpoint_stable_ms", ENDPOINT_STABLE_MS)),
+            )
 
         while True:
             data = await websocket.receive_bytes()
             transcriber.stream_audio(data)
+            if spotter:
+                spotter.on_silence(transcriber.vad.silence_ms)
+            if endpointer:
+                endpointer.on_silence(transcriber.vad.silence_ms)
     except Exception as e:
         logging.info(f"WebSocket connection closed: {e}")
     finally:
+        # Stop any turn still synthesizing for a socket that is gone
+        if scheduler:
+            await scheduler.close()
+            logging.info(f"Turn stats: {scheduler.counters}")
+        if speculator:
+            speculator.cancel()
+            logging.info(f"Speculation stats: {speculator.counters}, hit rate {speculator.hit_rate:.0%}")
+        if spotter:
+            logging.info(f"Quick reply spotting stats: {spotter.counters}")
+        if endpointer:
+            logging.info(f"Endpointing stats: {endpointer.counters}, mean lead {endpointer.mean_lead_ms:.0f} ms")
+        # Process-wide: the audio cache is shared by every session
+        logging.info(f"TTS cache stats: {tts.cache_stats()}")
         if 'transcriber' in locals() and transcriber:
-            transcriber.close()
+            # close() waits for the sender thread to flush, so keep it off the loop
+            await loop.run_in_executor(None, transcriber.close)
+        llm.release_session(session_id)
         logging.info("Transcription resources released.")
\ No newline at end of file
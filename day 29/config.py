@@ -2,7 +2,6 @@
 import os
 from dotenv import load_dotenv
 import assemblyai as aai
-import google.generativeai as genai
 import logging
 
 # Load environment variables from .env file
@@ -20,9 +19,8 @@ if ASSEMBLYAI_API_KEY:
 else:
     logging.warning("ASSEMBLYAI_API_KEY not found in .env file.")
 
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
-else:
+# Gemini is not configured process-wide: services/clients.py binds each key to its own clients
+if not GEMINI_API_KEY:
     logging.warning("GEMINI_API_KEY not found in .env file.")
 
 if not MURF_API_KEY:
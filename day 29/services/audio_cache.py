@@ -0,0 +1,196 @@
+# services/audio_cache.py
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_text(text: str) -> str:
+    """Collapse whitespace so trivially different sentences share a cache entry."""
+    return " ".join((text or "").split())
+
+
+def make_key(text: str, voice_id: str, style: str, audio_format: str) -> str:
+    """Content address for a rendered clip: normalized text + voice + style + format."""
+    raw = "\x1f".join([normalize_text(text), voice_id or "", style or "", (audio_format or "").upper()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class AudioCache:
+    """
+    Two-tier cache for synthesized audio:
+      - memory: LRU bounded by a total byte budget
+      - disk:   one file per key under `disk_dir`, bounded by `max_disk_bytes`
+    Keys registered with pin() are held in memory outside the LRU and never evicted.
+
+    Safe to use from the executor threads that run TTS calls.
+    """
+
+    def __init__(
+        self,
+        max_memory_bytes: int = 32 * 1024 * 1024,
+        disk_dir: Optional[Path] = None,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._disk_bytes = 0
+        if self.disk_dir:
+            self.disk_dir.mkdir(parents=True, exist_ok=True)
+            self._disk_bytes = sum(p.stat().st_size for p in self.disk_dir.glob("*.audio"))
+
+        self._entries: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._pinned_keys = set()
+        self._pinned: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+        self._counters = {
+            "pinned_hits": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "memory_evictions": 0,
+            "disk_evictions": 0,
+        }
+
+    # ---------------- PUBLIC API ----------------
+    def get_memory(self, key: str) -> Optional[bytes]:
+        """Memory tier only; never touches the disk, so it is safe to call on the event loop."""
+        with self._lock:
+            data = self._pinned.get(key)
+            if data is not None:
+                self._counters["pinned_hits"] += 1
+                return data
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+                self._counters["memory_hits"] += 1
+            return data
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Both tiers; a disk hit is promoted to memory. Blocks on disk I/O."""
+        data = self.get_memory(key)
+        if data is not None:
+            return data
+
+        data = self._read_disk(key)
+        with self._lock:
+            if data is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["disk_hits"] += 1
+            self._store_memory(key, data)
+        return data
+
+    def put(self, key: str, data: bytes):
+        if not data:
+            return
+        with self._lock:
+            self._store_memory(key, data)
+        self._write_disk(key, data)
+
+    def pin(self, key: str):
+        """Keeps this key's clip in memory for good once it has been rendered."""
+        with self._lock:
+            self._pinned_keys.add(key)
+            data = self._entries.pop(key, None)
+            if data is not None:
+                self._memory_bytes -= len(data)
+                self._pinned[key] = data
+
+    def is_pinned_and_ready(self, key: str) -> bool:
+        with self._lock:
+            return key in self._pinned
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._counters)
+            stats["hits"] = stats["pinned_hits"] + stats["memory_hits"] + stats["disk_hits"]
+            stats["pinned_entries"] = len(self._pinned)
+            stats["evictions"] = stats["memory_evictions"] + stats["disk_evictions"]
+            stats["memory_entries"] = len(self._entries)
+            stats["memory_bytes"] = self._memory_bytes
+        return stats
+
+    # ---------------- MEMORY TIER ----------------
+    def _store_memory(self, key: str, data: bytes):
+        if key in self._pinned_keys:
+            self._pinned[key] = data
+            return
+        # Clips larger than the whole budget only live on disk
+        if len(data) > self.max_memory_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= len(old)
+        self._entries[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._counters["memory_evictions"] += 1
+
+    # ---------------- DISK TIER ----------------
+    def _disk_path(self, key: str) -> Optional[Path]:
+        return self.disk_dir / f"{key}.audio" if self.disk_dir else None
+
+    def _read_disk(self, key: str) -> Optional[bytes]:
+        path = self._disk_path(key)
+        if path is None:
+            return None
+        try:
+            data = path.read_bytes()
+            os.utime(path)  # bump mtime so disk eviction is LRU as well
+            return data
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            logger.warning(f"Audio cache read failed for {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, data: bytes):
+        path = self._disk_path(key)
+        if path is None:
+            return
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        try:
+            tmp_path.write_bytes(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Audio cache write failed for {key}: {e}")
+            tmp_path.unlink(missing_ok=True)
+            return
+
+        with self._lock:
+            self._disk_bytes += len(data)
+            over_budget = self._disk_bytes > self.max_disk_bytes
+        if over_budget:
+            self._trim_disk()
+
+    def _trim_disk(self):
+        # Only rescan the directory once the running total crosses the budget
+        try:
+            files = [(p.stat(), p) for p in self.disk_dir.glob("*.audio")]
+        except OSError:
+            return
+        total = sum(st.st_size for st, _ in files)
+        files.sort(key=lambda item: item[0].st_mtime)
+        evicted = 0
+        for st, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= st.st_size
+            evicted += 1
+        with self._lock:
+            self._disk_bytes = total
+            self._counters["disk_evictions"] += evicted
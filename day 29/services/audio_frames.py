@@ -0,0 +1,41 @@
+# services/audio_frames.py
+"""
+Binary WebSocket framing for TTS audio.
+
+Every frame is a fixed 12-byte header followed by the raw audio bytes:
+
+    version  u8   FRAME_VERSION
+    codec    u8   CODEC_WAV / CODEC_MP3
+    flags    u8   FLAG_FINAL when this frame closes the clip
+    (pad)    u8
+    turn_id  u32  increments once per user turn
+    seq      u32  chunk index inside the clip
+
+All integers are big-endian. static/script.js mirrors this layout.
+"""
+import struct
+from typing import Tuple
+
+FRAME_VERSION = 1
+
+CODEC_WAV = 1
+CODEC_MP3 = 2
+CODECS = {"WAV": CODEC_WAV, "MP3": CODEC_MP3}
+
+FLAG_FINAL = 0x01
+
+HEADER = struct.Struct("!BBBxII")
+
+
+def pack(turn_id: int, seq: int, audio: bytes, final: bool = False, codec: int = CODEC_WAV) -> bytes:
+    """Builds one binary audio frame."""
+    flags = FLAG_FINAL if final else 0
+    return HEADER.pack(FRAME_VERSION, codec, flags, turn_id & 0xFFFFFFFF, seq & 0xFFFFFFFF) + audio
+
+
+def unpack(frame: bytes) -> Tuple[int, int, int, bool, bytes]:
+    """Splits a frame into (turn_id, seq, codec, final, audio)."""
+    version, codec, flags, turn_id, seq = HEADER.unpack_from(frame)
+    if version != FRAME_VERSION:
+        raise ValueError(f"Unsupported audio frame version: {version}")
+    return turn_id, seq, codec, bool(flags & FLAG_FINAL), frame[HEADER.size:]
@@ -0,0 +1,131 @@
+# services/clients.py
+"""
+Registry of upstream API clients, one per (service, API key).
+
+Keys arrive per WebSocket in the `config` message, so clients cannot be
+module-level singletons. Reusing one client per key keeps its HTTP
+connection pool (and TLS sessions) warm across sentences and turns, and
+never lets one tenant's key leak into another tenant's calls.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+import google.generativeai as genai
+from google.ai import generativelanguage as glm
+from murf import AsyncMurf
+
+logger = logging.getLogger(__name__)
+
+HTTP_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+HTTP_LIMITS = httpx.Limits(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60.0)
+
+
+class ClientRegistry:
+    """
+    Thread-safe cache of clients keyed by (service, api_key).
+      - clients idle for longer than `idle_ttl` seconds are closed
+      - at most `max_clients` are kept, least recently used closed first
+    """
+
+    def __init__(self, idle_ttl: float = 900, max_clients: int = 64):
+        self.idle_ttl = idle_ttl
+        self.max_clients = max_clients
+        # (service, api_key) -> (client, closer, last used)
+        self._clients: Dict[Tuple[str, str], Tuple[Any, Optional[Callable], float]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, service: str, api_key: str, factory: Callable[[], Tuple[Any, Optional[Callable]]]):
+        """Returns the client for this key, building it with `factory` -> (client, closer) if needed."""
+        key = (service, api_key or "")
+        with self._lock:
+            stale = self._collect_stale(time.monotonic())
+            entry = self._clients.get(key)
+            if entry is not None:
+                self._clients[key] = (entry[0], entry[1], time.monotonic())
+
+        if entry is None:
+            # Building a client opens sockets/channels; keep that out of the lock
+            built = factory()
+            with self._lock:
+                entry = self._clients.get(key)
+                if entry is None:
+                    entry = built + (0.0,)
+                else:
+                    stale.append(built + (0.0,))  # another thread won the race; use its client
+                self._clients[key] = (entry[0], entry[1], time.monotonic())
+                if len(self._clients) > self.max_clients:
+                    oldest = min(self._clients, key=lambda k: self._clients[k][2])
+                    stale.append(self._clients.pop(oldest))
+
+        for _, stale_closer, _ in stale:
+            self._close(stale_closer)
+        return entry[0]
+
+    def close_all(self):
+        with self._lock:
+            entries, self._clients = list(self._clients.values()), {}
+        for _, closer, _ in entries:
+            self._close(closer)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._clients)
+
+    def _collect_stale(self, now: float):
+        stale_keys = [k for k, (_, _, used) in self._clients.items() if now - used > self.idle_ttl]
+        return [self._clients.pop(k) for k in stale_keys]
+
+    @staticmethod
+    def _close(closer: Optional[Callable]):
+        if closer is None:
+            return
+        try:
+            result = closer()
+            if asyncio.iscoroutine(result):
+                try:
+                    asyncio.get_running_loop().create_task(result)
+                except RuntimeError:
+                    result.close()  # no loop to close it on; let the pool be collected
+        except Exception as e:
+            logger.warning(f"Error closing client: {e}")
+
+
+registry = ClientRegistry(
+    idle_ttl=float(os.getenv("CLIENT_IDLE_TTL_SECONDS", 900)),
+    max_clients=int(os.getenv("CLIENT_REGISTRY_MAX", 64)),
+)
+
+
+# ---------------- MURF ----------------
+def async_murf(api_key: str) -> AsyncMurf:
+    """Async Murf client with a keep-alive connection pool for this key."""
+    def build():
+        http = httpx.AsyncClient(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS)
+        return AsyncMurf(api_key=api_key, httpx_client=http), http.aclose
+    return registry.get("murf-async", api_key, build)
+
+
+# ---------------- GEMINI ----------------
+def gemini_model(api_key: str, model_name: str, system_instruction: str = None):
+    """
+    GenerativeModel bound to this key's own gRPC clients, instead of the
+    process-wide genai.configure() that concurrent tenants would race on.
+    """
+    def build():
+        model = genai.GenerativeModel(model_name, system_instruction=system_instruction)
+        options = {"api_key": api_key}
+        # GenerativeModel only falls back to the global default clients when these are unset
+        model._client = glm.GenerativeServiceClient(client_options=options)
+        model._async_client = glm.GenerativeServiceAsyncClient(client_options=options)
+
+        def close():
+            model._client.transport.close()
+            # send_message_async uses this channel; its close() is a coroutine
+            return model._async_client.transport.close()
+        return model, close
+    return registry.get(f"gemini:{model_name}", api_key, build)
@@ -0,0 +1,132 @@
+# services/endpointing.py
+"""
+Local end-of-turn detection.
+
+AssemblyAI's end_of_turn arrives only after its own silence timeout, and the
+formatted version of the final after another round trip. Locally we already
+know how long the speaker has been silent (from the VAD) and whether the
+partial transcript is still changing, so the turn can be declared over as soon
+as both have settled and the LLM started on the latest partial.
+
+The upstream final still arrives and is compared with the local decision:
+the comparison decides whether the final needs a turn of its own, and is
+counted so the thresholds can be tuned.
+"""
+import logging
+import os
+import time
+from typing import Callable, Dict, List, Optional
+
+from services.llm import normalize_utterance
+from services.turns import TurnToken
+
+logger = logging.getLogger(__name__)
+
+LOCAL_ENDPOINTING = os.getenv("LOCAL_ENDPOINTING", "1") == "1"
+# Trailing VAD silence needed to end a turn
+ENDPOINT_SILENCE_MS = int(os.getenv("ENDPOINT_SILENCE_MS", 500))
+# ...and the partial transcript must not have changed for this long
+ENDPOINT_STABLE_MS = int(os.getenv("ENDPOINT_STABLE_MS", 300))
+ENDPOINT_MIN_WORDS = int(os.getenv("ENDPOINT_MIN_WORDS", 1))
+
+# Outcomes of reconcile()
+HANDLED = "handled"    # the local turn already answers this final
+REVISED = "revised"    # the final replaces the local turn (other words, or it never answered)
+UPSTREAM = "upstream"  # no local decision, the final is a new turn
+
+
+class Endpointer:
+    """
+    Per-session end-of-turn detector, fed on the loop thread.
+      - on_partial(text) for every partial transcript
+      - on_silence(silence_ms) after every audio chunk, with the VAD's trailing silence
+      - reconcile(final_text) for every upstream final
+
+    `on_end(text, revises)` is called once the turn is over; `revises` is True
+    when an earlier local decision in the same utterance turned out premature.
+    `current_turn()` returns the session's latest turn, so reconcile() can tell
+    whether the turn started locally was cancelled before it said anything.
+    """
+
+    def __init__(
+        self,
+        on_end: Callable[[str, bool], None],
+        can_end: Callable[[], bool] = lambda: True,
+        current_turn: Callable[[], Optional[TurnToken]] = lambda: None,
+        silence_ms: int = ENDPOINT_SILENCE_MS,
+        stable_ms: int = ENDPOINT_STABLE_MS,
+        min_words: int = ENDPOINT_MIN_WORDS,
+    ):
+        self.on_end = on_end
+        self.can_end = can_end
+        self.current_turn = current_turn
+        self.silence_ms = silence_ms
+        self.stable_seconds = stable_ms / 1000
+        self.min_words = min_words
+
+        self._text = ""
+        self._key: Optional[str] = None
+        self._changed_at = 0.0
+        self._fired_key: Optional[str] = None
+        self._fired_at = 0.0
+        self._premature = False
+        self._lead_ms: List[float] = []
+        self.counters: Dict[str, int] = {
+            "local": 0, "agreed": 0, "revised": 0, "lost": 0, "premature": 0, "upstream_first": 0,
+        }
+
+    @property
+    def mean_lead_ms(self) -> float:
+        """Average time local decisions came before the matching upstream final."""
+        return sum(self._lead_ms) / len(self._lead_ms) if self._lead_ms else 0.0
+
+    @property
+    def fired(self) -> bool:
+        """A local end of turn was declared for the current utterance."""
+        return self._fired_key is not None
+
+    def on_partial(self, text: str):
+        key = normalize_utterance(text)
+        if key == self._key:
+            return
+        self._text, self._key, self._changed_at = text, key, time.monotonic()
+        if self._fired_key is not None and key != self._fired_key and not self._premature:
+            # The user kept talking after we declared the turn over
+            self._premature = True
+            self.counters["premature"] += 1
+
+    def on_silence(self, silence_ms: int):
+        if self._key is None or self._key == self._fired_key or silence_ms < self.silence_ms:
+            return
+        if len(self._key.split()) < self.min_words:
+            return
+        if time.monotonic() - self._changed_at < self.stable_seconds or not self.can_end():
+            return
+        revises = self._fired_key is not None
+        self._fired_key, self._fired_at, self._premature = self._key, time.monotonic(), False
+        self.counters["local"] += 1
+        self.on_end(self._text, revises)
+
+    def reconcile(self, final_text: str) -> str:
+        """Compares an upstream final with the local decision and resets for the next utterance."""
+        fired, self._fired_key = self._fired_key, None
+        self._text, self._key = "", None
+        if fired is None:
+            self.counters["upstream_first"] += 1
+            return UPSTREAM
+
+        lead_ms = (time.monotonic() - self._fired_at) * 1000
+        turn = self.current_turn()
+        if turn is not None and normalize_utterance(turn.text) == fired and turn.cancelled and not turn.output_started:
+            # Right call, but its turn never answered; the final has to
+            self.counters["lost"] += 1
+            logger.info(f"Local turn for {fired!r} was cancelled ({turn.reason}) before answering; resubmitting")
+            return REVISED
+        if normalize_utterance(final_text) == fired:
+            self.counters["agreed"] += 1
+            self._lead_ms.append(lead_ms)
+            logger.info(f"Local endpoint agreed with upstream, {lead_ms:.0f} ms earlier")
+            return HANDLED
+        self.counters["revised"] += 1
+        logger.info(f"Local endpoint revised by upstream final {lead_ms:.0f} ms later: {fired!r} -> {final_text!r}")
+        return REVISED
@@ -0,0 +1,109 @@
+# services/intents.py
+"""
+Spots whole-utterance quick-reply phrases ("hi", "thank you", ...) in partial
+transcripts, so their cached audio can start before AssemblyAI finalizes the turn.
+"""
+import os
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+# A matching partial must stay unchanged this long before it counts as the whole utterance
+INTENT_STABLE_MS = int(os.getenv("INTENT_STABLE_MS", 250))
+# ...and the VAD must have heard this much silence after it (below ENDPOINT_SILENCE_MS, so the spotter goes first)
+INTENT_SILENCE_MS = int(os.getenv("INTENT_SILENCE_MS", 300))
+
+_END = ""  # never a word, so it can mark phrase ends inside the trie
+
+
+class PhraseTrie:
+    """Word-level trie over normalized phrases, built once."""
+
+    def __init__(self, phrases: Dict[str, str], normalize: Callable[[str], str]):
+        self.normalize = normalize
+        self._root: Dict[str, dict] = {}
+        for phrase, value in phrases.items():
+            node = self._root
+            for word in normalize(phrase).split():
+                node = node.setdefault(word, {})
+            node[_END] = value
+
+    def match(self, text: str) -> Tuple[Optional[str], bool]:
+        """
+        Returns (value if the whole text is a phrase, whether a longer phrase
+        starting with the text exists). (None, False) means no phrase can match.
+        """
+        node = self._root
+        for word in self.normalize(text).split():
+            node = node.get(word)
+            if node is None:
+                return None, False
+        return node.get(_END), any(key != _END for key in node)
+
+
+class IntentSpotter:
+    """
+    Per-session spotter fed with partial transcripts and the VAD's trailing silence.
+
+    It fires `on_match(text)` once a partial is exactly a phrase that no longer
+    phrase extends, has stayed that way for `stable_ms`, and the speaker has
+    been silent for `silence_ms`, so a pause inside a longer sentence does not
+    count. The final transcript of the same utterance must then go through
+    reconcile(), which says whether the turn was already handled.
+    """
+
+    def __init__(
+        self,
+        trie: PhraseTrie,
+        on_match: Callable[[str], None],
+        can_fire: Callable[[], bool] = lambda: True,
+        stable_ms: int = INTENT_STABLE_MS,
+        silence_ms: int = INTENT_SILENCE_MS,
+    ):
+        self.trie = trie
+        self.on_match = on_match
+        self.can_fire = can_fire
+        self.stable_seconds = stable_ms / 1000
+        self.silence_ms = silence_ms
+        self._key: Optional[str] = None
+        self._text = ""
+        self._candidate = False
+        self._changed_at = 0.0
+        self._fired_key: Optional[str] = None
+        self.counters: Dict[str, int] = {"fired": 0, "reconciled": 0, "overruled": 0}
+
+    @property
+    def fired(self) -> bool:
+        """The current utterance has already been answered from a partial."""
+        return self._fired_key is not None
+
+    def on_partial(self, text: str):
+        """Call on the loop thread for every partial transcript."""
+        key = self.trie.normalize(text)
+        if key == self._key:
+            return
+        self._key, self._text, self._changed_at = key, text, time.monotonic()
+        value, extendable = self.trie.match(key)
+        self._candidate = value is not None and not extendable
+
+    def on_silence(self, silence_ms: int):
+        """Call on the loop thread after every audio chunk."""
+        if not self._candidate or self._fired_key is not None or silence_ms < self.silence_ms:
+            return
+        if time.monotonic() - self._changed_at < self.stable_seconds or not self.can_fire():
+            return
+        self._fired_key = self._key
+        self.counters["fired"] += 1
+        self.on_match(self._text)
+
+    def reconcile(self, final_text: str) -> bool:
+        """True if this final belongs to an utterance the spotter already answered."""
+        fired, self._fired_key = self._fired_key, None
+        self._key, self._text, self._candidate = None, "", False
+        if fired is None:
+            return False
+        if self.trie.normalize(final_text) == fired:
+            self.counters["reconciled"] += 1
+            return True
+        # The user kept talking after the phrase; the rest needs a real answer
+        self.counters["overruled"] += 1
+        return False
@@ -2,10 +2,17 @@
 SILLY AI (Smart Interactive Light-hearted Language Yielding AI)
 """
 
-import google.generativeai as genai
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
+from collections import OrderedDict
 from serpapi import GoogleSearch
+from services import clients
+from services.intents import PhraseTrie
+from services.singleflight import SingleFlight
 import logging
+import os
+import re
+import threading
+import time
 
 # ---------------- LOGGING ----------------
 logger = logging.getLogger(__name__)
@@ -30,20 +37,85 @@ Be the funniest, most helpful sidekick ever — part stand-up comedian 🤡,
 part genius researcher 🧠, and part friendly buddy 👯.
 """
 
+# ---------------- SESSION CHAT POOL ----------------
+DEFAULT_SESSION = "default"
+
+class ChatPool:
+    """
+    One Gemini ChatSession per session id, reused across turns.
+      - at most `max_sessions` chats, least recently used evicted first
+      - chats idle for longer than `ttl_seconds` are dropped
+      - each chat keeps only its last `max_history_messages` messages
+    """
+
+    def __init__(self, max_sessions: int = 256, ttl_seconds: float = 1800, max_history_messages: int = 40):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.max_history_messages = max_history_messages
+        self._chats: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str, api_key: str):
+        model = clients.gemini_model(api_key, 'gemini-1.5-flash', system_instructions)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._chats.pop(session_id, None)
+            chat = entry[0] if entry else None
+            if chat is None:
+                chat = model.start_chat(history=[])
+            else:
+                # The registry may have rebuilt this key's client since the last turn
+                chat.model = model
+            self._chats[session_id] = (chat, now)
+            while len(self._chats) > self.max_sessions:
+                evicted_id, _ = self._chats.popitem(last=False)
+                logger.info(f"Evicted chat session {evicted_id} (pool full)")
+        self._trim_history(chat)
+        return chat
+
+    def release(self, session_id: str):
+        with self._lock:
+            self._chats.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._chats)
+
+    def _evict_expired(self, now: float):
+        # Entries are kept in last-used order, so expired ones sit at the front
+        while self._chats:
+            session_id, (_, last_used) = next(iter(self._chats.items()))
+            if now - last_used <= self.ttl_seconds:
+                break
+            self._chats.popitem(last=False)
+            logger.info(f"Evicted idle chat session {session_id}")
+
+    def _trim_history(self, chat):
+        history = chat.history
+        if len(history) <= self.max_history_messages:
+            return
+        trimmed = history[-self.max_history_messages:]
+        # History must open with a user message
+        while trimmed and trimmed[0].role != "user":
+            trimmed = trimmed[1:]
+        chat.history = trimmed
+
+
+chat_pool = ChatPool(
+    max_sessions=int(os.getenv("LLM_MAX_SESSIONS", 256)),
+    ttl_seconds=float(os.getenv("LLM_SESSION_TTL_SECONDS", 1800)),
+    max_history_messages=int(os.getenv("LLM_MAX_HISTORY_MESSAGES", 40)),
+)
+
 # ---------------- INIT GEMINI MODEL ----------------
-chat = None
-
-def init_model(api_key: str):
-    """Initialize persistent Gemini chat model."""
-    global chat
-    if chat is None:
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel(
-            'gemini-1.5-flash',
-            system_instruction=system_instructions
-        )
-        chat = model.start_chat(history=[])
-    return chat
+def init_model(api_key: str, session_id: str = DEFAULT_SESSION):
+    """Get (or create) the persistent Gemini chat for this session."""
+    return chat_pool.get(session_id, api_key)
+
+def release_session(session_id: str):
+    """Drop a session's chat once its client disconnects."""
+    chat_pool.release(session_id)
 
 # ---------------- RULE-BASED SEARCH DETECTION ----------------
 def should_search_web(user_query: str, history=None) -> bool:
@@ -55,44 +127,59 @@ def should_search_web(user_query: str, history=None) -> bool:
                 "who is", "what is", "population", "price", "time in", "score"]
     return any(k in user_query.lower() for k in keywords)
 
+# ---------------- QUICK REPLIES ----------------
+QUICK_REPLIES = {
+    "hello": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
+    "hi": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
+    "hey": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
+    "bye": "ooooo noooo , ok buddy Catch you later👋",
+    "goodbye": "ooooo noooo , ok buddy Catch you later👋",
+    "good night": "Ok Buddy , GOOD NIGHT :) Sleep tight! 🌙😴",
+    "see you": "ooooo noooo , ok buddy Catch you later👋",
+    "thanks": "Anytime, amigo! 🤝 Always here to help.",
+    "thank you": "Anytime, amigo! 🤝 Always here to help.",
+}
+
+_NON_WORD = re.compile(r"[^\w\s']+")
+
+def normalize_utterance(text: str) -> str:
+    """Lowercase, drop punctuation/emoji and collapse whitespace ("Hello!!" -> "hello")."""
+    return " ".join(_NON_WORD.sub(" ", (text or "").lower()).split())
+
+# Built once at import; also used to spot quick replies in partial transcripts
+QUICK_REPLY_TRIE = PhraseTrie(QUICK_REPLIES, normalize_utterance)
+QUICK_REPLY_TEXTS = sorted(set(QUICK_REPLIES.values()))
+
+def match_quick_reply(user_query: str) -> Optional[str]:
+    """Canned reply for a greeting/farewell/thanks utterance, or None."""
+    reply, _ = QUICK_REPLY_TRIE.match(user_query)
+    return reply
+
 # ---------------- LLM RESPONSE ----------------
 def get_llm_response(
     user_query: str,
     history: List[Dict[str, Any]],
-    api_key: str
+    api_key: str,
+    session_id: str = DEFAULT_SESSION
 ) -> Tuple[str, List[Dict[str, Any]]]:
     """
     Generate a response from Gemini LLM.
-    Handles quick replies and persistent chat session.
+    Handles quick replies and the session's persistent chat.
     """
     try:
-        normalized = user_query.strip().lower()
-
         # Hardcoded instant replies (fast path)
-        quick_replies = {
-            "hello": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
-            "hi": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
-            "hey": "Hey buddy, welcome to Silly Yard :) How can I make your day brighter? 😄",
-            "bye": "ooooo noooo , ok buddy Catch you later👋",
-            "goodbye": "ooooo noooo , ok buddy Catch you later👋",
-            "good night": "Ok Buddy , GOOD NIGHT :) Sleep tight! 🌙😴",
-            "see you": "ooooo noooo , ok buddy Catch you later👋",
-            "thanks": "Anytime, amigo! 🤝 Always here to help.",
-            "thank you": "Anytime, amigo! 🤝 Always here to help.",
-        }
-
-        if normalized in quick_replies:
-            reply = quick_replies[normalized]
+        reply = match_quick_reply(user_query)
+        if reply is not None:
             history.append({"role": "user", "parts": [user_query]})
             history.append({"role": "model", "parts": [reply]})
             return reply, history
 
         # Check if web search needed
         if should_search_web(user_query, history):
-            return get_web_response(user_query, history, api_key, serp_api_key="YOUR_SERPAPI_KEY")
+            return get_web_response(user_query, history, api_key, serp_api_key="YOUR_SERPAPI_KEY", session_id=session_id)
 
-        # Persistent Gemini chat
-        chat = init_model(api_key)
+        # Persistent Gemini chat for this session
+        chat = init_model(api_key, session_id)
         response = chat.send_message(user_query)
         return response.text, chat.history
 
@@ -101,29 +188,44 @@ def get_llm_response(
         return "Oops 🤖💥 something went wrong while processing your request.", history
 
 # ---------------- WEB RESPONSE ----------------
+_search_flights = SingleFlight()
+
+def build_search_prompt(user_query: str, serp_api_key: str) -> Optional[str]:
+    """
+    Runs a SerpAPI search and wraps the top snippets into a Gemini prompt (None if nothing found).
+    Stateless, so identical searches running at the same time share one request.
+    """
+    return _search_flights.do((user_query, serp_api_key), _search_prompt, user_query, serp_api_key)
+
+def _search_prompt(user_query: str, serp_api_key: str) -> Optional[str]:
+    params = {"q": user_query, "api_key": serp_api_key, "engine": "google"}
+    search = GoogleSearch(params)
+    results = search.get_dict()
+
+    if "organic_results" not in results:
+        return None
+    snippets = [r.get("snippet", "") for r in results["organic_results"][:3]]
+    search_context = "\n".join(snippets)
+    return (
+        f"User asked: '{user_query}'\n\n"
+        f"Based on these search results:\n{search_context}\n\n"
+        "Give a short, witty, and clear reply as SILLY AI."
+    )
+
 def get_web_response(
     user_query: str,
     history: List[Dict[str, Any]],
     gemini_api_key: str,
-    serp_api_key: str
+    serp_api_key: str,
+    session_id: str = DEFAULT_SESSION
 ) -> Tuple[str, List[Dict[str, Any]]]:
     """
     Perform a web search using SerpAPI and return an LLM-crafted reply.
     """
     try:
-        params = {"q": user_query, "api_key": serp_api_key, "engine": "google"}
-        search = GoogleSearch(params)
-        results = search.get_dict()
-
-        if "organic_results" in results:
-            snippets = [r.get("snippet", "") for r in results["organic_results"][:3]]
-            search_context = "\n".join(snippets)
-            prompt = (
-                f"User asked: '{user_query}'\n\n"
-                f"Based on these search results:\n{search_context}\n\n"
-                "Give a short, witty, and clear reply as SILLY AI."
-            )
-            return get_llm_response(prompt, history, gemini_api_key)
+        prompt = build_search_prompt(user_query, serp_api_key)
+        if prompt is not None:
+            return get_llm_response(prompt, history, gemini_api_key, session_id)
         else:
             return "Hmm 🤔 I couldn't find anything useful on the web.", history
 
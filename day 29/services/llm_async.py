@@ -0,0 +1,116 @@
+# services/llm_async.py
+"""
+Async adapter over services/llm.py.
+
+Gemini calls go through the SDK's async API (send_message_async), so a slow
+generation only suspends the turn that asked for it. Work that has no async
+API (SerpAPI search) runs on a small dedicated executor instead of the loop.
+Every upstream wait is bounded by a timeout and stops cleanly on cancellation.
+"""
+import asyncio
+import functools
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from services import llm
+from services.turns import TurnToken
+
+logger = logging.getLogger(__name__)
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 30))
+
+# Bounded pool for blocking calls, kept apart from the default executor used by TTS
+_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("LLM_EXECUTOR_WORKERS", 8)),
+    thread_name_prefix="llm-blocking",
+)
+
+
+async def run_blocking(func, *args, timeout: float = LLM_TIMEOUT_SECONDS):
+    """Runs a blocking call on the LLM executor and waits at most `timeout` seconds."""
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(
+        loop.run_in_executor(_executor, functools.partial(func, *args)), timeout
+    )
+
+
+def _quick_reply(user_query: str, history: List[Dict[str, Any]]):
+    reply = llm.match_quick_reply(user_query)
+    if reply is not None:
+        history.append({"role": "user", "parts": [user_query]})
+        history.append({"role": "model", "parts": [reply]})
+    return reply
+
+
+async def stream_llm_response(
+    user_query: str,
+    history: List[Dict[str, Any]],
+    api_key: str,
+    session_id: str = llm.DEFAULT_SESSION,
+    timeout: float = LLM_TIMEOUT_SECONDS,
+    token: Optional[TurnToken] = None
+) -> AsyncIterator[str]:
+    """
+    Streaming, async counterpart of llm.get_llm_response() (without web routing): yields text deltas.
+    `timeout` bounds the wait for each delta, not the whole reply.
+    `history` is updated in place once the reply is complete.
+    Stops (leaving history untouched) as soon as `token` is cancelled.
+    """
+    reply = _quick_reply(user_query, history)
+    if reply is not None:
+        yield reply
+        return
+
+    chat = llm.init_model(api_key, session_id)
+    committed = list(chat.history)
+    completed = False
+    try:
+        response = await asyncio.wait_for(chat.send_message_async(user_query, stream=True), timeout)
+        chunks = response.__aiter__()
+        while True:
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+            except StopAsyncIteration:
+                break
+            if token:
+                token.check()
+            if chunk.text:
+                yield chunk.text
+        completed = True
+        history[:] = chat.history
+    except Exception as e:
+        logger.error(f"Error streaming LLM response: {e}")
+        yield "Oops 🤖💥 something went wrong while processing your request."
+    finally:
+        # A reply cut off by cancellation, timeout or error must not poison the next turn:
+        # resetting history also clears the chat's half-read streaming response
+        if not completed:
+            chat.history = committed
+
+
+async def stream_web_response(
+    user_query: str,
+    history: List[Dict[str, Any]],
+    gemini_api_key: str,
+    serp_api_key: str,
+    session_id: str = llm.DEFAULT_SESSION,
+    timeout: float = LLM_TIMEOUT_SECONDS,
+    token: Optional[TurnToken] = None
+) -> AsyncIterator[str]:
+    """Streaming, async counterpart of llm.get_web_response(); the search runs on the LLM executor."""
+    try:
+        prompt = await run_blocking(llm.build_search_prompt, user_query, serp_api_key, timeout=timeout)
+    except Exception as e:
+        logger.error(f"Error in web search: {e}")
+        yield "Uh-oh 😬 I hit a snag while searching the web."
+        return
+
+    if prompt is None:
+        yield "Hmm 🤔 I couldn't find anything useful on the web."
+        return
+    if token:
+        token.check()
+    async for delta in stream_llm_response(prompt, history, gemini_api_key, session_id, timeout, token):
+        yield delta
@@ -0,0 +1,123 @@
+# services/singleflight.py
+"""
+Collapses identical concurrent upstream calls into one.
+
+While a call for some key is in flight, further callers with the same key
+wait for that call instead of starting their own, and all of them get its
+result or its exception. Nothing is cached: once the call finishes the key is
+forgotten, and the next caller goes upstream again.
+
+AsyncStreamFlight does the same for async generators: every caller gets the
+whole stream, replayed from the start if it joined late, then live.
+"""
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Callable, Dict, Hashable, List, Optional
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """For blocking functions called from several threads."""
+
+    def __init__(self):
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class _Stream:
+    def __init__(self):
+        self.items: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.readers = 0
+        self.task: Optional[asyncio.Task] = None
+
+
+class AsyncStreamFlight:
+    """
+    For async generators on one event loop. The shared generator runs as its
+    own task and keeps what it has produced, so callers can join at any point;
+    it is cancelled only once every caller has stopped reading.
+    """
+
+    def __init__(self):
+        self._streams: Dict[Hashable, _Stream] = {}
+        self.shared = 0
+
+    async def stream(self, key: Hashable, func: Callable[..., AsyncIterator], *args, **kwargs) -> AsyncIterator:
+        entry = self._streams.get(key)
+        if entry is None:
+            entry = self._streams[key] = _Stream()
+            entry.task = asyncio.ensure_future(self._pump(key, entry, func(*args, **kwargs)))
+        else:
+            self.shared += 1
+
+        entry.readers += 1
+        sent = 0
+        try:
+            while True:
+                while sent < len(entry.items):
+                    yield entry.items[sent]
+                    sent += 1
+                if entry.done:
+                    if entry.error is not None:
+                        raise entry.error
+                    return
+                entry.changed.clear()
+                await entry.changed.wait()
+        finally:
+            entry.readers -= 1
+            if entry.readers == 0 and not entry.done:
+                # Last reader gone: later callers must start afresh, not join a cancelled stream
+                self._forget(key, entry)
+                entry.task.cancel()
+
+    async def _pump(self, key: Hashable, entry: _Stream, items: AsyncIterator):
+        try:
+            async for item in items:
+                entry.items.append(item)
+                entry.changed.set()
+        except Exception as e:
+            entry.error = e
+        finally:
+            entry.done = True
+            self._forget(key, entry)
+            entry.changed.set()
+
+    def _forget(self, key: Hashable, entry: _Stream):
+        if self._streams.get(key) is entry:
+            del self._streams[key]
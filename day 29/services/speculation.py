@@ -0,0 +1,163 @@
+# services/speculation.py
+"""
+Speculative LLM requests on partial transcripts.
+
+When a partial transcript has not changed for `stable_ms`, the user has most
+likely finished talking and AssemblyAI is only waiting out its end-of-turn
+silence. The LLM request for that text is started right away and its deltas
+are buffered. If the final transcript says the same thing, the turn replays the
+buffer and continues live; otherwise the request is cancelled and the chat
+history is rolled back.
+"""
+import asyncio
+import logging
+import os
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+from services.llm import normalize_utterance
+from services.turns import TurnToken
+
+logger = logging.getLogger(__name__)
+
+SPECULATIVE_LLM = os.getenv("SPECULATIVE_LLM", "0") == "1"
+SPECULATION_STABLE_MS = int(os.getenv("SPECULATION_STABLE_MS", 400))
+SPECULATION_MIN_WORDS = 2
+
+class _Flight:
+    """One speculative LLM stream and everything it has produced so far."""
+
+    def __init__(self, key: str, token: TurnToken, restore: Callable[[], None]):
+        self.key = key
+        self.token = token
+        self.restore = restore
+        self.deltas: List[str] = []
+        self.done = False
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    async def run(self, deltas: AsyncIterator[str]):
+        try:
+            async for delta in deltas:
+                self.deltas.append(delta)
+                self.changed.set()
+        finally:
+            self.done = True
+            self.changed.set()
+
+    async def replay(self) -> AsyncIterator[str]:
+        """Buffered deltas first, then live ones until the stream ends."""
+        sent = 0
+        try:
+            while True:
+                while sent < len(self.deltas):
+                    yield self.deltas[sent]
+                    sent += 1
+                if self.done:
+                    return
+                self.changed.clear()
+                await self.changed.wait()
+        finally:
+            # The turn consuming us was cancelled or closed early
+            if not self.done:
+                self.token.cancel("turn cancelled")
+
+
+class Speculator:
+    """
+    Watches partial transcripts for one session and speculates on stable ones.
+      - `start_stream(text, token)` returns the LLM delta stream for `text`
+      - `snapshot()` captures the chat history and returns a function restoring it
+      - `can_start()` says whether the session is idle enough to speculate
+    """
+
+    def __init__(
+        self,
+        start_stream: Callable[[str, TurnToken], AsyncIterator[str]],
+        snapshot: Callable[[], Callable[[], None]],
+        can_start: Callable[[], bool] = lambda: True,
+        stable_ms: int = SPECULATION_STABLE_MS,
+    ):
+        self.start_stream = start_stream
+        self.snapshot = snapshot
+        self.can_start = can_start
+        self.stable_seconds = stable_ms / 1000
+        self._partial_key: Optional[str] = None
+        self._partial_text = ""
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flight: Optional[_Flight] = None
+        self._unwinding: Optional[asyncio.Future] = None
+        self.counters: Dict[str, int] = {"started": 0, "hits": 0, "misses": 0}
+
+    @property
+    def hit_rate(self) -> float:
+        started = self.counters["started"]
+        return self.counters["hits"] / started if started else 0.0
+
+    def on_partial(self, text: str):
+        """Call on the loop thread for every partial transcript."""
+        key = normalize_utterance(text)
+        if key == self._partial_key:
+            return
+        self._partial_key, self._partial_text = key, text
+        if self._flight is not None and self._flight.key != key:
+            self._discard()
+        if self._timer is not None:
+            self._timer.cancel()
+        if len(key.split()) >= SPECULATION_MIN_WORDS:
+            self._timer = asyncio.get_running_loop().call_later(self.stable_seconds, self._fire, key)
+
+    async def take(self, final_text: str) -> Optional[AsyncIterator[str]]:
+        """
+        Returns the speculative stream if it answers `final_text`, else cancels it and
+        returns None once its chat history changes have been rolled back.
+        """
+        self._reset_partial()
+        flight = self._flight
+        if flight is not None and flight.key == normalize_utterance(final_text) and not flight.token.cancelled:
+            self._flight = None
+            self.counters["hits"] += 1
+            logger.info(f"Speculation hit ({self.hit_rate:.0%} so far)")
+            return flight.replay()
+        if flight is not None:
+            self._discard()
+        if self._unwinding is not None:
+            await self._unwinding
+            self._unwinding = None
+        return None
+
+    def cancel(self):
+        self._reset_partial()
+        if self._flight is not None:
+            self._discard()
+
+    def _fire(self, key: str):
+        self._timer = None
+        if key != self._partial_key or self._flight is not None or not self.can_start():
+            return
+        if self._unwinding is not None and not self._unwinding.done():
+            return
+        flight = _Flight(key, TurnToken(0, self._partial_text), self.snapshot())
+        flight.task = asyncio.get_running_loop().create_task(
+            flight.run(self.start_stream(self._partial_text, flight.token))
+        )
+        flight.token.bind(flight.task)
+        self._flight = flight
+        self.counters["started"] += 1
+
+    def _discard(self):
+        flight, self._flight = self._flight, None
+        flight.token.cancel("speculation miss")
+        self._unwinding = asyncio.ensure_future(self._settle(flight))
+        self.counters["misses"] += 1
+
+    @staticmethod
+    async def _settle(flight: _Flight):
+        # Let the cancelled stream unwind first, then take back a reply it already committed
+        await asyncio.wait({flight.task})
+        flight.restore()
+
+    def _reset_partial(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        self._partial_key, self._partial_text = None, ""
@@ -1,4 +1,7 @@
 # services/stt.py
+import threading
+from collections import deque
+
 import assemblyai as aai
 from assemblyai.streaming.v3 import (
     StreamingClient,
@@ -12,6 +15,13 @@ from assemblyai.streaming.v3 import (
     StreamingError,
 )
 
+from services.vad import VoiceActivityDetector
+
+# Upper bound on the silence AssemblyAI waits for before ending a turn it isn't confident about
+MAX_TURN_SILENCE_MS = 1000
+# The VAD keeps forwarding trailing silence a little longer than that, so upstream always sees enough of it
+HANGOVER_MARGIN_MS = 200
+
 def _on_begin(client: StreamingClient, event: BeginEvent):
     print(f"AAI session started: {event.id}")
 
@@ -25,18 +35,66 @@ class AssemblyAIStreamingTranscriber:
     """
     Wrapper around AAI StreamingClient that exposes:
       - on_partial_callback(text) for interim results
-      - on_final_callback(text)   when end_of_turn=True
+      - on_final_callback(text, turn_order, formatted) when end_of_turn=True;
+        with formatting on, a turn's final comes twice under the same turn_order
+    Silence is dropped by a VoiceActivityDetector before audio goes upstream
+    (pass use_vad=False to forward everything). Its hangover is derived from
+    max_turn_silence_ms, so the silence AssemblyAI needs always reaches it.
+
+    Finals are re-requested with formatting (punctuation, casing) unless
+    format_turns=False, which saves the extra round trip when the text is only
+    compared against a local end-of-turn decision.
+
+    stream_audio() never touches the network: chunks go into a bounded queue
+    drained by a dedicated sender thread, which also opens the upstream
+    connection; if that connect fails, the next stream_audio() call raises it.
+    When the queue is full, overflow_policy decides:
+      - "coalesce":    merge the two oldest chunks (up to 1 s of audio), else drop
+      - "drop_oldest": discard the oldest chunk
     """
 
+    OVERFLOW_POLICIES = ("coalesce", "drop_oldest")
+
     def __init__(
         self,
         sample_rate: int = 16000,
         on_partial_callback=None,
         on_final_callback=None,
-        api_key: str = None
+        api_key: str = None,
+        use_vad: bool = True,
+        format_turns: bool = True,
+        max_turn_silence_ms: int = MAX_TURN_SILENCE_MS,
+        max_queue_chunks: int = 32,
+        overflow_policy: str = "coalesce",
+        close_timeout: float = 2.0
     ):
+        if overflow_policy not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"overflow_policy must be one of {self.OVERFLOW_POLICIES}")
         self.on_partial_callback = on_partial_callback
         self.on_final_callback = on_final_callback
+        self.vad = (
+            VoiceActivityDetector(sample_rate=sample_rate, hangover_ms=max_turn_silence_ms + HANGOVER_MARGIN_MS)
+            if use_vad else None
+        )
+        self.format_turns = format_turns
+
+        # Upstream accepts at most 1 s of 16-bit audio per message
+        self.max_chunk_bytes = sample_rate * 2
+        self.max_queue_chunks = max_queue_chunks
+        self.overflow_policy = overflow_policy
+        self.close_timeout = close_timeout
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._closed = False
+        self._connect_error = None
+        self._metrics = {
+            "enqueued": 0,
+            "sent": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "send_errors": 0,
+            "max_depth": 0,
+        }
 
         self.client = StreamingClient(
             StreamingClientOptions(
@@ -54,12 +112,17 @@ class AssemblyAIStreamingTranscriber:
             lambda client, event: self._on_turn(client, event),
         )
 
-        self.client.connect(
-            StreamingParameters(
+        self._sender = threading.Thread(
+            target=self._send_loop,
+            args=(StreamingParameters(
                 sample_rate=sample_rate,
                 format_turns=False,
-            )
+                max_turn_silence=max_turn_silence_ms,
+            ),),
+            name="aai-sender",
+            daemon=True,
         )
+        self._sender.start()
 
     def _on_turn(self, client: StreamingClient, event: TurnEvent):
         text = (event.transcript or "").strip()
@@ -68,9 +131,9 @@ class AssemblyAIStreamingTranscriber:
 
         if event.end_of_turn:
             if self.on_final_callback:
-                self.on_final_callback(text)
+                self.on_final_callback(text, event.turn_order, event.turn_is_formatted)
 
-            if not event.turn_is_formatted:
+            if self.format_turns and not event.turn_is_formatted:
                 try:
                     client.set_params(StreamingSessionParameters(format_turns=True))
                 except Exception as set_err:
@@ -80,7 +143,87 @@ class AssemblyAIStreamingTranscriber:
                 self.on_partial_callback(text)
 
     def stream_audio(self, audio_chunk: bytes):
-        self.client.stream(audio_chunk)
+        if self._connect_error is not None:
+            raise ConnectionError(f"AssemblyAI connect failed: {self._connect_error}")
+        if self.vad:
+            audio_chunk = self.vad.process(audio_chunk)
+            if not audio_chunk:
+                return
+        with self._cond:
+            if self._closed:
+                return
+            if len(self._queue) >= self.max_queue_chunks:
+                self._make_room()
+            self._queue.append(audio_chunk)
+            self._metrics["enqueued"] += 1
+            self._metrics["max_depth"] = max(self._metrics["max_depth"], len(self._queue))
+            self._cond.notify()
+
+    def _make_room(self):
+        # Called with self._cond held and the queue full
+        if self.overflow_policy == "coalesce" and len(self._queue) >= 2:
+            first, second = self._queue[0], self._queue[1]
+            if len(first) + len(second) <= self.max_chunk_bytes:
+                self._queue.popleft()
+                self._queue[0] = first + second
+                self._metrics["coalesced"] += 1
+                return
+        self._queue.popleft()
+        self._metrics["dropped"] += 1
+
+    def _send_loop(self, params: StreamingParameters):
+        try:
+            self.client.connect(params)
+        except Exception as connect_err:
+            print("AAI connect error:", connect_err)
+            with self._cond:
+                self._connect_error = connect_err
+                self._closed = True
+                self._queue.clear()
+            return
+
+        # This thread owns the session: whatever close() saw, it is torn down here
+        try:
+            with self._cond:
+                if self._closed:
+                    # Closed while connecting: nobody is left to hear the transcripts
+                    self._queue.clear()
+            while True:
+                with self._cond:
+                    while not self._queue and not self._closed:
+                        self._cond.wait()
+                    if not self._queue:
+                        return
+                    chunk = self._queue.popleft()
+                try:
+                    self.client.stream(chunk)
+                    counter = "sent"
+                except Exception as send_err:
+                    counter = "send_errors"
+                    print("AAI stream error:", send_err)
+                with self._cond:
+                    self._metrics[counter] += 1
+        finally:
+            try:
+                self.client.disconnect(terminate=True)
+            except Exception as disconnect_err:
+                print("AAI disconnect error:", disconnect_err)
+
+    def queue_stats(self):
+        with self._cond:
+            stats = dict(self._metrics)
+            stats["depth"] = len(self._queue)
+        return stats
+
+    def vad_stats(self):
+        return self.vad.stats() if self.vad else None
 
     def close(self):
-        self.client.disconnect(terminate=True)
\ No newline at end of file
+        # The sender flushes what is queued, then tears down the upstream session itself
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._sender.join(timeout=self.close_timeout)
+        if self.vad:
+            print("AAI VAD stats:", self.vad.stats())
+        print("AAI sender stats:", self.queue_stats())
\ No newline at end of file
@@ -1,40 +1,252 @@
 # services/tts.py
 import requests
-from typing import List, Dict, Any
-from murf import Murf
+from typing import List, Dict, Any, AsyncIterable, AsyncIterator, Optional, Tuple, Union
 from pathlib import Path
 import logging
 import os
+import asyncio
+import hashlib
+import re
+
+from services import clients
+from services.audio_cache import AudioCache, make_key
+from services.singleflight import AsyncStreamFlight
+from services.turns import TurnToken
 
 logger = logging.getLogger(__name__)
 
 MURF_API_URL = "https://api.murf.ai/v1/speech"
 
+DEFAULT_VOICE_ID = "en-IN-priya"
+DEFAULT_STYLE = "Conversational"
+STREAM_FORMAT = "WAV"
+MIRROR_BUFFER_BYTES = 256 * 1024
+
+# How many sentences of one answer may be synthesized at the same time
+DEFAULT_PIPELINE_WINDOW = int(os.getenv("TTS_PIPELINE_WINDOW", 3))
+MAX_PIPELINE_WINDOW = 8
+
 # Ensure uploads folder exists
 UPLOADS_DIR = Path(__file__).resolve().parent.parent / "uploads"
 UPLOADS_DIR.mkdir(exist_ok=True)
 
-def speak(text: str, api_key: str, output_file: str = "stream_output.wav"):
+# Rendered sentences are content-addressed, so repeats skip the Murf round trip
+audio_cache = AudioCache(
+    max_memory_bytes=int(os.getenv("TTS_CACHE_MEMORY_BYTES", 32 * 1024 * 1024)),
+    disk_dir=UPLOADS_DIR / "tts_cache",
+    max_disk_bytes=int(os.getenv("TTS_CACHE_DISK_BYTES", 256 * 1024 * 1024)),
+)
+
+# Identical sentences streamed at the same moment, e.g. by concurrent sessions, share one Murf call
+_stream_flights = AsyncStreamFlight()
+
+
+def _flight_key(cache_key: str, api_key: str) -> Tuple[str, str]:
     """
-    Convert text to speech using Murf API and save audio in uploads folder.
+    Renders are only shared between callers with the same Murf key, so one
+    tenant's bad key never fails (or bills) another tenant's render.
+    The finished audio is content-addressed and shared through the cache.
     """
-    client = Murf(api_key=api_key)
+    return cache_key, hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()
 
-    file_path = UPLOADS_DIR / output_file
 
-    # Start with a clean file
-    open(file_path, "wb").close()
+async def stream_speak(
+    text: str,
+    api_key: str,
+    voice_id: str = DEFAULT_VOICE_ID,
+    style: str = DEFAULT_STYLE,
+    mirror_file: Optional[str] = None,
+) -> AsyncIterator[bytes]:
+    """
+    Converts text to speech with Murf, yielding audio chunks as they arrive.
+    The first chunk carries the WAV header. A cache hit yields the whole clip at once.
+    Set `mirror_file` to also copy the audio into the uploads folder (buffered).
+    A render of the same clip already in flight is joined instead of calling Murf again.
+    """
+    cache_key = make_key(text, voice_id, style, STREAM_FORMAT)
+    cached = audio_cache.get_memory(cache_key)
+    if cached is None:
+        # A memory miss falls through to the disk tier; keep that file I/O off the loop
+        cached = await asyncio.to_thread(audio_cache.get, cache_key)
+    if cached is not None:
+        yield cached
+        return
 
-    res = client.text_to_speech.stream(
-        text=text,
-        voice_id = "en-IN-priya",
-        style="Conversational"
+    mirror = open(UPLOADS_DIR / mirror_file, "wb", buffering=MIRROR_BUFFER_BYTES) if mirror_file else None
+    flight = _stream_flights.stream(
+        _flight_key(cache_key, api_key), _render_stream, cache_key, text, api_key, voice_id, style
     )
+    try:
+        async for audio_chunk in flight:
+            if mirror:
+                mirror.write(audio_chunk)
+            yield audio_chunk
+    finally:
+        # Leave the shared render now, not whenever this generator is collected
+        await flight.aclose()
+        if mirror:
+            mirror.close()
+
+
+async def _render_stream(cache_key: str, text: str, api_key: str, voice_id: str, style: str) -> AsyncIterator[bytes]:
+    client = clients.async_murf(api_key)
+    chunks = []
+    async for audio_chunk in client.text_to_speech.stream(
+        text=text,
+        voice_id=voice_id,
+        style=style
+    ):
+        if not audio_chunk:
+            continue
+        chunks.append(audio_chunk)
+        yield audio_chunk
+
+    # Only fully rendered clips get here; a cancelled stream is never cached
+    await asyncio.to_thread(audio_cache.put, cache_key, b"".join(chunks))
+
+
+# ---------------- SENTENCE SEGMENTATION ----------------
+SENTENCE_BOUNDARY = re.compile(r'(?<=[.?!])\s+')
+
+
+class SentenceBuffer:
+    """Accumulates streamed text and hands back sentences as soon as they are complete."""
+
+    def __init__(self):
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        self._buffer += text
+        parts = SENTENCE_BOUNDARY.split(self._buffer)
+        self._buffer = parts.pop()
+        return [p.strip() for p in parts if p.strip()]
+
+    def flush(self) -> Optional[str]:
+        tail, self._buffer = self._buffer.strip(), ""
+        return tail or None
+
+
+# ---------------- PIPELINED SYNTHESIS ----------------
+_CLIP_DONE = object()
+
+
+async def _iterate(sentences: Union[List[str], AsyncIterable[str]]) -> AsyncIterator[str]:
+    if isinstance(sentences, list):
+        for sentence in sentences:
+            yield sentence
+    else:
+        async for sentence in sentences:
+            yield sentence
+
+
+async def stream_sentences(
+    sentences: Union[List[str], AsyncIterable[str]],
+    api_key: str,
+    window: int = DEFAULT_PIPELINE_WINDOW,
+    voice_id: str = DEFAULT_VOICE_ID,
+    style: str = DEFAULT_STYLE,
+    token: Optional[TurnToken] = None,
+) -> AsyncIterator[Tuple[int, int, bytes, bool]]:
+    """
+    Synthesizes up to `window` sentences concurrently but yields their audio strictly
+    in order as (sentence_index, seq, chunk, final). The head sentence streams live while
+    the ones behind it buffer; each clip ends with an empty chunk where final=True.
+    `sentences` may be a list or an async iterable still being produced (e.g. by the LLM).
+    Closing or cancelling the consumer cancels every synthesis still in flight; once
+    `token` is cancelled no new sentence is started and nothing more is yielded.
+    """
+    window = max(1, min(window, MAX_PIPELINE_WINDOW))
+    slots = asyncio.Semaphore(window)
+    clips = asyncio.Queue()
+    tasks = set()
+
+    async def produce(text: str, queue: asyncio.Queue):
+        try:
+            if token:
+                token.check()
+            async for audio_chunk in stream_speak(text, api_key, voice_id, style):
+                queue.put_nowait(audio_chunk)
+        except Exception as e:
+            queue.put_nowait(e)
+        queue.put_nowait(_CLIP_DONE)
+
+    async def feed():
+        try:
+            index = 0
+            async for text in _iterate(sentences):
+                await slots.acquire()
+                if token:
+                    token.check()
+                queue = asyncio.Queue()
+                task = asyncio.create_task(produce(text, queue))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                clips.put_nowait((index, queue))
+                index += 1
+        except Exception as e:
+            clips.put_nowait(e)
+        clips.put_nowait(None)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while True:
+            clip = await clips.get()
+            if clip is None:
+                break
+            if isinstance(clip, Exception):
+                raise clip
+            index, queue = clip
+            seq = 0
+            while True:
+                item = await queue.get()
+                if item is _CLIP_DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                if token:
+                    token.check()
+                yield index, seq, item, False
+                seq += 1
+            yield index, seq, b"", True
+            slots.release()
+    finally:
+        feeder.cancel()
+        for task in list(tasks):
+            task.cancel()
+
+
+# ---------------- PINNED PHRASES ----------------
+def split_sentences(text: str) -> List[str]:
+    """Splits text exactly the way the streaming pipeline does."""
+    buffer = SentenceBuffer()
+    sentences = buffer.feed(text)
+    tail = buffer.flush()
+    return sentences + [tail] if tail else sentences
+
+
+def pin_phrases(texts: List[str], voice_id: str = DEFAULT_VOICE_ID, style: str = DEFAULT_STYLE) -> List[str]:
+    """
+    Marks the sentences of these texts as permanent cache entries: once rendered
+    (by prerender() or lazily on first use) they are served from memory forever.
+    """
+    sentences = [sentence for text in texts for sentence in split_sentences(text)]
+    for sentence in sentences:
+        audio_cache.pin(make_key(sentence, voice_id, style, STREAM_FORMAT))
+    return sentences
+
+
+async def prerender(texts: List[str], api_key: str, voice_id: str = DEFAULT_VOICE_ID, style: str = DEFAULT_STYLE):
+    """Synthesizes every pinned sentence of `texts` that is not in memory yet."""
+    for sentence in pin_phrases(texts, voice_id, style):
+        if audio_cache.is_pinned_and_ready(make_key(sentence, voice_id, style, STREAM_FORMAT)):
+            continue
+        try:
+            async for _ in stream_speak(sentence, api_key, voice_id, style):
+                pass
+        except Exception as e:
+            logger.warning(f"Could not pre-render '{sentence}': {e}")
 
-    audio_bytes = b""
-    for audio_chunk in res:
-        audio_bytes += audio_chunk
-        with open(file_path, "ab") as f:
-            f.write(audio_chunk)
 
-    return audio_bytes
\ No newline at end of file
+def cache_stats() -> Dict[str, int]:
+    """Hit/miss/eviction counters for the TTS audio cache."""
+    return audio_cache.stats()
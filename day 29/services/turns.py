@@ -0,0 +1,222 @@
+# services/turns.py
+"""
+Turn bookkeeping for one voice session.
+
+A TurnToken is handed to every stage of a turn (LLM, sentence splitting, TTS,
+sending). Cancelling it cancels the turn's task, and stages that check it stop
+starting new work or sending stale output even before the cancellation lands.
+
+A TurnScheduler decides when final transcripts become turns, so that a session
+never runs two pipelines against the same chat history at once.
+"""
+import asyncio
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+# A partial transcript needs at least this many words to interrupt the assistant
+BARGE_IN_MIN_WORDS = int(os.getenv("BARGE_IN_MIN_WORDS", 2))
+
+# How finals that arrive while a turn is busy are handled (see TurnScheduler)
+DEFAULT_TURN_POLICY = os.getenv("TURN_POLICY", "merge")
+# Finals closer together than this become one LLM request
+TURN_COALESCE_MS = int(os.getenv("TURN_COALESCE_MS", 300))
+
+
+def _join(*texts: Optional[str]) -> str:
+    return " ".join(t for t in texts if t)
+
+
+class TurnToken:
+    """Cancellation handle for one turn."""
+
+    def __init__(self, turn_id: int, text: str = ""):
+        self.turn_id = turn_id
+        self.text = text
+        self.reason: Optional[str] = None
+        # Set by the pipeline once anything of the reply has reached the client
+        self.output_started = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self.reason is not None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def bind(self, task: asyncio.Task):
+        self._task = task
+        if self.cancelled:
+            task.cancel()
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Cancels the turn; returns False if it was already cancelled."""
+        if self.cancelled:
+            return False
+        self.reason = reason
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+        return True
+
+    def check(self):
+        """Raises CancelledError once the turn has been cancelled."""
+        if self.cancelled:
+            raise asyncio.CancelledError(self.reason)
+
+
+class TurnScheduler:
+    """
+    Turns final transcripts into turns, one at a time per session.
+
+    Finals arriving within `coalesce_ms` of each other are joined into one
+    request. AssemblyAI re-sends each final once formatted, under the same
+    turn_order; is_redelivery() spots those. A final that arrives while a turn
+    is running is handled by `policy`:
+      - "serialize": it waits and runs after the current turn
+      - "supersede": it cancels the current turn and replaces anything waiting
+      - "merge":     if the current turn has not sent any output yet, it is
+                     cancelled and rerun with both utterances as one request;
+                     otherwise as "serialize"
+    Waiting finals are merged into a single pending turn, so at most two turns
+    are in flight per session: one running and one waiting.
+    """
+
+    POLICIES = ("serialize", "supersede", "merge")
+
+    def __init__(
+        self,
+        run_turn: Callable[[str, TurnToken], Awaitable[None]],
+        policy: str = DEFAULT_TURN_POLICY,
+        coalesce_ms: int = TURN_COALESCE_MS,
+        on_cancel: Optional[Callable[[TurnToken], None]] = None,
+    ):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown turn policy: {policy}")
+        self.run_turn = run_turn
+        self.policy = policy
+        self.coalesce_seconds = coalesce_ms / 1000
+        self.on_cancel = on_cancel
+
+        self._pending: Optional[str] = None
+        self._last_arrival = 0.0
+        self._last_turn_order: Optional[int] = None
+        self._current: Optional[TurnToken] = None
+        self._merged_turn = 0
+        self._turn_ids = 0
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self.counters: Dict[str, int] = {"finals": 0, "turns": 0, "coalesced": 0, "duplicates": 0, "cancelled": 0}
+
+    @property
+    def current(self) -> Optional[TurnToken]:
+        """The most recently started turn (possibly finished)."""
+        return self._current
+
+    def start(self):
+        self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    def is_redelivery(self, turn_order: Optional[int], formatted: bool) -> bool:
+        """
+        True for the formatted copy of an upstream final already seen; call for
+        every upstream final, before reconciling or submitting it.
+        """
+        if turn_order is None:
+            return False
+        if formatted and turn_order == self._last_turn_order:
+            self.counters["duplicates"] += 1
+            return True
+        self._last_turn_order = turn_order
+        return False
+
+    def submit(self, text: str, immediate: bool = False, revises: bool = False):
+        """
+        Queues a final transcript; call on the loop thread. `immediate` skips the
+        coalescing wait. `revises` marks text that restates the current turn's
+        words (a premature local end of turn): it replaces that turn, if it has
+        not spoken yet, instead of being merged with it.
+        """
+        text = text.strip()
+        if not text:
+            return
+        self.counters["finals"] += 1
+        now = time.monotonic()
+
+        current = self._current
+        if revises and current is not None and current.turn_id != self._merged_turn:
+            self._merged_turn = current.turn_id
+            if not current.output_started:
+                self.cancel_current("revised")
+        busy = current is not None and current.running and not current.cancelled
+        # A turn cut off by barge-in before it said anything is still unanswered
+        unanswered = (
+            current is not None
+            and not current.output_started
+            and (busy or current.reason == "barge-in")
+            and current.turn_id != self._merged_turn
+        )
+        if busy and self.policy == "supersede":
+            self.cancel_current("superseded")
+            self._pending = text
+        elif unanswered and self.policy == "merge":
+            self.cancel_current("merged")
+            self._merged_turn = current.turn_id
+            self._pending = _join(current.text, self._pending, text)
+            self.counters["coalesced"] += 1
+        else:
+            if self._pending:
+                self.counters["coalesced"] += 1
+            self._pending = _join(self._pending, text)
+
+        self._last_arrival = now - self.coalesce_seconds if immediate else now
+        self._wakeup.set()
+
+    def cancel_current(self, reason: str) -> Optional[TurnToken]:
+        """Cancels the latest turn (barge-in, supersede); returns it if it was not cancelled already."""
+        current = self._current
+        if current is None or not current.cancel(reason):
+            return None
+        self.counters["cancelled"] += 1
+        if self.on_cancel:
+            self.on_cancel(current)
+        return current
+
+    async def close(self):
+        """Stops the worker and cancels whatever is running."""
+        self._pending = None
+        if self._current is not None:
+            self._current.cancel("closed")
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Let rapid-fire finals settle into a single request
+            while True:
+                delay = self._last_arrival + self.coalesce_seconds - time.monotonic()
+                if delay <= 0:
+                    break
+                await asyncio.sleep(delay)
+            self._wakeup.clear()
+
+            text, self._pending = self._pending, None
+            if not text:
+                continue
+            self._turn_ids += 1
+            self.counters["turns"] += 1
+            token = TurnToken(self._turn_ids, text)
+            task = asyncio.get_running_loop().create_task(self.run_turn(text, token))
+            token.bind(task)
+            self._current = token
+            try:
+                # Returns when the turn ends, however it ends
+                await asyncio.wait({task})
+            except asyncio.CancelledError:
+                task.cancel()
+                raise
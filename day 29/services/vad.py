@@ -0,0 +1,149 @@
+# services/vad.py
+"""
+Server-side voice activity detection for 16-bit mono PCM.
+
+Per-frame energy (RMS) and zero-crossing rate are computed with NumPy for a
+whole incoming buffer at once; only the cheap hangover / pre-roll state
+machine walks the frames one by one. Silence is dropped, speech is forwarded
+with a short pre-roll before onset and a hangover after the last voiced frame.
+"""
+from collections import deque
+from typing import Dict
+
+import numpy as np
+
+BYTES_PER_SAMPLE = 2
+
+
+class VoiceActivityDetector:
+    """
+    Feed raw PCM with process(); it returns the bytes worth sending upstream
+    (possibly b"").
+
+    Notes on the defaults:
+      - hangover_ms keeps trailing silence flowing long enough for AssemblyAI
+        to detect end of turn on its own.
+      - emitted chunks are at least min_chunk_ms long (AssemblyAI rejects
+        shorter inputs), padded with silence when speech ends.
+      - during long silence a short silent keepalive chunk is sent every
+        keepalive_ms so the upstream session does not idle out.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int = 16000,
+        frame_ms: int = 20,
+        energy_threshold: float = 300.0,
+        noise_ratio: float = 3.0,
+        zcr_max: float = 0.35,
+        preroll_ms: int = 200,
+        hangover_ms: int = 1200,
+        min_chunk_ms: int = 100,
+        keepalive_ms: int = 5000,
+    ):
+        self.frame_ms = frame_ms
+        self.frame_samples = sample_rate * frame_ms // 1000
+        self.frame_bytes = self.frame_samples * BYTES_PER_SAMPLE
+        self.energy_threshold = energy_threshold
+        self.noise_ratio = noise_ratio
+        self.zcr_max = zcr_max
+        self.hangover_frames = max(1, hangover_ms // frame_ms)
+        self.keepalive_frames = max(1, keepalive_ms // frame_ms)
+        self.min_chunk_bytes = sample_rate * min_chunk_ms // 1000 * BYTES_PER_SAMPLE
+
+        self._preroll = deque(maxlen=max(0, preroll_ms // frame_ms))
+        self._remainder = b""
+        self._pending = bytearray()
+        self._hang = 0
+        self._silent_frames = 0
+        self._trailing_silence = 0
+        self._noise_floor = energy_threshold / noise_ratio
+
+        self.bytes_in = 0
+        self.bytes_forwarded = 0
+        self.bytes_dropped = 0
+        self.voiced_frames = 0
+        self.total_frames = 0
+
+    # ---------------- FEATURES ----------------
+    def _voiced_mask(self, samples: np.ndarray) -> np.ndarray:
+        frames = samples.reshape(-1, self.frame_samples).astype(np.float32)
+        energy = np.sqrt(np.mean(frames * frames, axis=1))
+        signs = np.signbit(frames)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / (self.frame_samples - 1)
+
+        threshold = max(self.energy_threshold, self._noise_floor * self.noise_ratio)
+        # Loud frames always count (fricatives have high ZCR); quieter ones must look like voicing
+        voiced = (energy > threshold * 2) | ((energy > threshold) & (zcr < self.zcr_max))
+
+        quiet = energy[~voiced]
+        if quiet.size:
+            self._noise_floor = 0.9 * self._noise_floor + 0.1 * float(quiet.mean())
+        return voiced
+
+    # ---------------- STREAMING ----------------
+    def process(self, pcm: bytes) -> bytes:
+        self.bytes_in += len(pcm)
+        data = self._remainder + pcm
+        usable = len(data) - len(data) % self.frame_bytes
+        self._remainder = data[usable:]
+        if not usable:
+            return b""
+
+        voiced = self._voiced_mask(np.frombuffer(data[:usable], dtype="<i2"))
+        self.total_frames += len(voiced)
+        self.voiced_frames += int(np.count_nonzero(voiced))
+
+        for i, is_voiced in enumerate(voiced.tolist()):
+            frame = data[i * self.frame_bytes:(i + 1) * self.frame_bytes]
+            self._trailing_silence = 0 if is_voiced else self._trailing_silence + 1
+            if is_voiced:
+                if self._hang == 0:
+                    self._pending += b"".join(self._preroll)
+                    self._preroll.clear()
+                self._hang = self.hangover_frames
+                self._silent_frames = 0
+                self._pending += frame
+            elif self._hang > 0:
+                self._hang -= 1
+                self._pending += frame
+                if self._hang == 0:
+                    self._pad_pending()
+            else:
+                # The frame falling out of the pre-roll window is the one actually dropped
+                if len(self._preroll) == self._preroll.maxlen:
+                    self.bytes_dropped += self.frame_bytes
+                self._preroll.append(frame)
+                self._silent_frames += 1
+                if self._silent_frames >= self.keepalive_frames and not self._pending:
+                    self._silent_frames = 0
+                    self._pending += bytes(self.min_chunk_bytes)
+
+        return self._emit()
+
+    def _pad_pending(self):
+        # Speech just ended: make the tail long enough to be accepted upstream
+        if 0 < len(self._pending) < self.min_chunk_bytes:
+            self._pending += bytes(self.min_chunk_bytes - len(self._pending))
+
+    def _emit(self) -> bytes:
+        if len(self._pending) < self.min_chunk_bytes:
+            return b""
+        chunk = bytes(self._pending)
+        self._pending.clear()
+        self.bytes_forwarded += len(chunk)
+        return chunk
+
+    @property
+    def silence_ms(self) -> int:
+        """How long the input has been unvoiced since the last voiced frame."""
+        return self._trailing_silence * self.frame_ms
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_forwarded": self.bytes_forwarded,
+            "bytes_dropped": self.bytes_dropped,
+            "voiced_frames": self.voiced_frames,
+            "total_frames": self.total_frames,
+        }
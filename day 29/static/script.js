@@ -12,8 +12,10 @@ document.addEventListener("DOMContentLoaded", () => {
     let audioContext;
     let mediaStream;
     let processor;
-    let audioQueue = [];
-    let isPlaying = false;
+    let playbackCursor = 0;
+    let currentClip = null;
+    let scheduledSources = new Set();
+    let flushedTurn = 0;
     let assistantMessageDiv = null;
 
     // Load saved API keys
@@ -40,11 +42,23 @@ document.addEventListener("DOMContentLoaded", () => {
     });
 
     const addOrUpdateMessage = (text, type) => {
-        if (type === "assistant") {
-            assistantMessageDiv = document.createElement('div');
-            assistantMessageDiv.className = 'message assistant';
+        if (type === "assistant_delta") {
+            // Grow the streaming reply in place
+            if (!assistantMessageDiv) {
+                assistantMessageDiv = document.createElement('div');
+                assistantMessageDiv.className = 'message assistant';
+                chatLog.appendChild(assistantMessageDiv);
+            }
+            assistantMessageDiv.textContent += text;
+        } else if (type === "assistant") {
+            // Final text replaces the streamed deltas of the same reply
+            if (!assistantMessageDiv) {
+                assistantMessageDiv = document.createElement('div');
+                assistantMessageDiv.className = 'message assistant';
+                chatLog.appendChild(assistantMessageDiv);
+            }
             assistantMessageDiv.textContent = text;
-            chatLog.appendChild(assistantMessageDiv);
+            assistantMessageDiv = null;
         } else {
             assistantMessageDiv = null;
             const messageDiv = document.createElement('div');
@@ -55,25 +69,129 @@ document.addEventListener("DOMContentLoaded", () => {
         chatLog.scrollTop = chatLog.scrollHeight;
     };
 
-    const playNextInQueue = () => {
-        if (audioQueue.length > 0) {
-            isPlaying = true;
-            const base64Audio = audioQueue.shift();
-            const audioData = Uint8Array.from(atob(base64Audio), c => c.charCodeAt(0)).buffer;
-            
-            audioContext.decodeAudioData(audioData).then(buffer => {
-                const source = audioContext.createBufferSource();
-                source.buffer = buffer;
-                source.connect(audioContext.destination);
-                source.onended = playNextInQueue;
-                source.start();
-            }).catch(e => {
-                console.error("Error decoding audio data:", e);
-                playNextInQueue();
-            });
-        } else {
-            isPlaying = false;
+    const base64ToBytes = (b64) => Uint8Array.from(atob(b64), c => c.charCodeAt(0));
+
+    // Binary audio frame header, see services/audio_frames.py
+    const AUDIO_FRAME_VERSION = 1;
+    const AUDIO_FRAME_HEADER_BYTES = 12;
+    const AUDIO_FLAG_FINAL = 0x01;
+
+    const handleAudioFrame = (buffer) => {
+        const view = new DataView(buffer);
+        if (buffer.byteLength < AUDIO_FRAME_HEADER_BYTES || view.getUint8(0) !== AUDIO_FRAME_VERSION) {
+            console.error("Unsupported audio frame");
+            return;
+        }
+        const flags = view.getUint8(2);
+        const turn = view.getUint32(4);
+        const seq = view.getUint32(8);
+        handleAudioChunk(new Uint8Array(buffer, AUDIO_FRAME_HEADER_BYTES), turn, seq, (flags & AUDIO_FLAG_FINAL) !== 0);
+    };
+
+    // Returns {sampleRate, channels, dataOffset} for a WAV header, or null if not RIFF/WAVE
+    const parseWavHeader = (bytes) => {
+        const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+        const tag = (offset) => String.fromCharCode(...bytes.subarray(offset, offset + 4));
+        if (bytes.length < 12 || tag(0) !== "RIFF" || tag(8) !== "WAVE") return null;
+
+        let format = null;
+        let pos = 12;
+        while (pos + 8 <= bytes.length) {
+            const id = tag(pos);
+            const size = view.getUint32(pos + 4, true);
+            if (id === "fmt ") {
+                format = { channels: view.getUint16(pos + 10, true), sampleRate: view.getUint32(pos + 12, true) };
+            } else if (id === "data" && format) {
+                return { ...format, dataOffset: pos + 8 };
+            }
+            pos += 8 + size + (size % 2);
+        }
+        return null;
+    };
+
+    // Schedules 16-bit PCM right after whatever is already queued, so chunks play gaplessly
+    const schedulePcm = (pcm, clip) => {
+        const frameBytes = 2 * clip.channels;
+        const frames = Math.floor(pcm.length / frameBytes);
+        if (frames === 0) return;
+
+        const view = new DataView(pcm.buffer, pcm.byteOffset, frames * frameBytes);
+        const buffer = audioContext.createBuffer(clip.channels, frames, clip.sampleRate);
+        for (let ch = 0; ch < clip.channels; ch++) {
+            const out = buffer.getChannelData(ch);
+            for (let i = 0; i < frames; i++) {
+                out[i] = view.getInt16((i * clip.channels + ch) * 2, true) / 32768;
+            }
+        }
+
+        playBuffer(buffer);
+    };
+
+    // Plays a fully buffered clip (non-WAV payloads) through the same cursor
+    const scheduleEncoded = (bytes, turn) => {
+        audioContext.decodeAudioData(bytes.buffer.slice(bytes.byteOffset, bytes.byteOffset + bytes.length)).then(buffer => {
+            if (turn > flushedTurn) playBuffer(buffer);
+        }).catch(e => console.error("Error decoding audio data:", e));
+    };
+
+    const playBuffer = (buffer) => {
+        const source = audioContext.createBufferSource();
+        source.buffer = buffer;
+        source.connect(audioContext.destination);
+        const startAt = Math.max(audioContext.currentTime, playbackCursor);
+        source.start(startAt);
+        playbackCursor = startAt + buffer.duration;
+        scheduledSources.add(source);
+        source.onended = () => scheduledSources.delete(source);
+    };
+
+    // Barge-in: stop everything queued for this turn (and earlier) and ignore its late chunks
+    const flushAudio = (turn) => {
+        flushedTurn = Math.max(flushedTurn, turn);
+        scheduledSources.forEach(source => {
+            try { source.stop(); } catch (e) { /* not started yet */ }
+        });
+        scheduledSources.clear();
+        playbackCursor = 0;
+        currentClip = null;
+        assistantMessageDiv = null;
+    };
+
+    const concatBytes = (a, b) => {
+        const out = new Uint8Array(a.length + b.length);
+        out.set(a, 0);
+        out.set(b, a.length);
+        return out;
+    };
+
+    // Consumes one streamed chunk of a clip; seq 0 carries the WAV header
+    const handleAudioChunk = (bytes, turn, seq, isFinal) => {
+        if (turn <= flushedTurn) return;
+        if (seq === 0) {
+            const header = parseWavHeader(bytes);
+            currentClip = header
+                ? { ...header, carry: new Uint8Array(0), encoded: null }
+                : { carry: null, encoded: new Uint8Array(0) };
+            if (header) bytes = bytes.subarray(header.dataOffset);
         }
+        if (!currentClip) return;
+
+        if (currentClip.encoded) {
+            currentClip.encoded = concatBytes(currentClip.encoded, bytes);
+            if (isFinal) {
+                scheduleEncoded(currentClip.encoded, turn);
+                currentClip = null;
+            }
+            return;
+        }
+
+        // Keep partial frames for the next chunk so samples stay aligned
+        const pcm = currentClip.carry.length ? concatBytes(currentClip.carry, bytes) : bytes;
+        const frameBytes = 2 * currentClip.channels;
+        const usable = pcm.length - (pcm.length % frameBytes);
+        schedulePcm(pcm.subarray(0, usable), currentClip);
+        currentClip.carry = pcm.slice(usable);
+        if (isFinal) currentClip = null;
     };
 
     const startRecording = async () => {
@@ -92,6 +210,10 @@ document.addEventListener("DOMContentLoaded", () => {
         try {
             mediaStream = await navigator.mediaDevices.getUserMedia({ audio: true });
             audioContext = new (window.AudioContext || window.webkitAudioContext)({ sampleRate: 16000 });
+            // The cursor is a time on the old context's clock; start over on the new one
+            playbackCursor = 0;
+            currentClip = null;
+            scheduledSources.clear();
 
             const source = audioContext.createMediaStreamSource(mediaStream);
             processor = audioContext.createScriptProcessor(4096, 1, 1);
@@ -109,23 +231,31 @@ document.addEventListener("DOMContentLoaded", () => {
             };
 
             const wsProtocol = window.location.protocol === "https:" ? "wss:" : "ws:";
-            ws = new WebSocket(`${wsProtocol}//${window.location.host}/ws`);
+            const socket = new WebSocket(`${wsProtocol}//${window.location.host}/ws`);
+            ws = socket;
+            ws.binaryType = "arraybuffer";
+            // Turn ids restart at 1 on every connection
+            flushedTurn = 0;
 
             ws.onopen = () => {
-                ws.send(JSON.stringify({ type: "config", keys: apiKeys }));
+                ws.send(JSON.stringify({ type: "config", keys: apiKeys, audio_transport: "binary" }));
             };
 
             ws.onmessage = (event) => {
+                if (ws !== socket) return;  // late message from a previous connection
+                if (event.data instanceof ArrayBuffer) {
+                    handleAudioFrame(event.data);
+                    return;
+                }
                 const msg = JSON.parse(event.data);
-                if (msg.type === "assistant") {
-                    addOrUpdateMessage(msg.text, "assistant");
+                if (msg.type === "assistant" || msg.type === "assistant_delta") {
+                    addOrUpdateMessage(msg.text, msg.type);
                 } else if (msg.type === "final") {
                     addOrUpdateMessage(msg.text, "user");
-                } else if (msg.type === "audio") {
-                    audioQueue.push(msg.b64);
-                    if (!isPlaying) {
-                        playNextInQueue();
-                    }
+                } else if (msg.type === "audio_chunk") {
+                    handleAudioChunk(base64ToBytes(msg.b64), msg.turn, msg.seq, msg.final);
+                } else if (msg.type === "flush") {
+                    flushAudio(msg.turn);
                 }
             };
             isRecording = true;